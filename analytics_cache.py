@@ -0,0 +1,121 @@
+import sqlite3
+import json
+import hashlib
+import threading
+import time
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Tuple
+
+# Configuration for the on-disk analytics cache
+CACHE_PATH = os.environ.get('ANALYTICS_CACHE_PATH', os.path.join('cache', 'analytics_cache.db'))
+FINAL_AFTER_HOURS = 48          # Days that ended this long ago no longer change upstream
+MUTABLE_TTL_SECONDS = 15 * 60   # How long a still-mutable day is served from the cache
+ALL_CAMPAIGNS = '*'             # campaign_id under which workspace-wide daily analytics are cached
+
+
+def workspace_key(api_key: str) -> str:
+    """Stable identifier for a workspace that does not store the raw API key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def is_final_day(date: str, now: Optional[datetime] = None) -> bool:
+    """Whether analytics for the given YYYY-MM-DD day can no longer change"""
+    now = now or datetime.now()
+    day_end = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
+    return day_end <= now - timedelta(hours=FINAL_AFTER_HOURS)
+
+
+class AnalyticsCache:
+    """
+    SQLite store of daily campaign analytics keyed by (workspace, campaign_id, date).
+
+    Every day covered by a successful upstream request is recorded, including days the
+    upstream returned nothing for (stored with an empty payload). Final days are served
+    from the cache forever; still-mutable days only for MUTABLE_TTL_SECONDS.
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_analytics (
+                workspace TEXT NOT NULL,
+                campaign_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                payload TEXT,
+                final INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (workspace, campaign_id, date)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def get_workspace_days(self, workspace: str, start_date: str, end_date: str,
+                           fetched_after: Optional[float] = None) -> Dict[str, Dict[str, Optional[Dict[str, Any]]]]:
+        """
+        Get usable cached days for every campaign of a workspace.
+        Args:
+            workspace: Workspace key (see workspace_key).
+            start_date: Start date in YYYY-MM-DD format.
+            end_date: End date in YYYY-MM-DD format (inclusive).
+            fetched_after: Also use still-mutable days fetched after this time (e.g. by the
+                interrupted run of a resumed job), however old.
+        Returns:
+            Dictionary of campaign_id -> {date: day analytics, or None if the upstream had no data}.
+        """
+        fresh_after = time.time() - MUTABLE_TTL_SECONDS
+        if fetched_after is not None:
+            fresh_after = min(fresh_after, fetched_after)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT campaign_id, date, payload FROM daily_analytics
+                WHERE workspace = ? AND date BETWEEN ? AND ?
+                  AND (final = 1 OR fetched_at >= ?)
+                """,
+                (workspace, start_date, end_date, fresh_after)
+            ).fetchall()
+
+        cached = {}
+        for campaign_id, date, payload in rows:
+            cached.setdefault(campaign_id, {})[date] = json.loads(payload) if payload else None
+        return cached
+
+    def store_chunk(self, workspace: str, campaign_id: str, chunk_start: str, chunk_end: str,
+                    days: List[Dict[str, Any]]):
+        """Record the upstream response for one campaign and date chunk"""
+        self.store_chunks(workspace, [(campaign_id, chunk_start, chunk_end, days)])
+
+    def store_chunks(self, workspace: str, chunks: List[Tuple[str, str, str, List[Dict[str, Any]]]]):
+        """Record upstream responses given as (campaign_id, chunk_start, chunk_end, days) in one transaction"""
+        now = datetime.now()
+        fetched_at = time.time()
+
+        rows = []
+        for campaign_id, chunk_start, chunk_end, days in chunks:
+            by_date = {day['date']: day for day in days if 'date' in day}
+            current = datetime.strptime(chunk_start, '%Y-%m-%d')
+            end = datetime.strptime(chunk_end, '%Y-%m-%d')
+            while current <= end:
+                date = current.strftime('%Y-%m-%d')
+                day = by_date.get(date)
+                rows.append((
+                    workspace, campaign_id, date,
+                    json.dumps(day) if day is not None else None,
+                    1 if is_final_day(date, now) else 0,
+                    fetched_at
+                ))
+                current += timedelta(days=1)
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily_analytics VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
@@ -0,0 +1,626 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+import aiohttp
+
+from async_http import DeferredRetry
+from instantly_campaign_api import AsyncInstantlyCampaignAPI, active_date_range, campaign_metadata
+from instantly_campaign_analytics_api import AsyncInstantlyCampaignAnalyticsAPI
+from analytics_cache import AnalyticsCache, ALL_CAMPAIGNS, workspace_key
+from chunk_planner import get_chunk_planner
+from job_progress import JobProgress
+from send_matrix import SendMatrix, workspace_matrix
+from task_scheduler import RetryPolicy, run_sliding_window, prefetch
+
+logger = logging.getLogger(__name__)
+
+# Receives the records emitted while a job is aggregated (see process_workspaces)
+EventCallback = Callable[[Dict[str, Any]], None]
+
+# Configuration for concurrent requests
+MAX_CONCURRENT_REQUESTS = 10  # Maximum number of requests kept in flight per API key
+MAX_GLOBAL_REQUESTS = 50     # Maximum number of requests in flight per job across all API keys
+MAX_BLOCKING_THREADS = 20    # Maximum number of blocking cache calls running in parallel
+CAMPAIGN_PAGE_PREFETCH = 1   # Pages of campaign IDs loaded ahead of the analytics requests
+CACHE_WRITE_BATCH = 500     # Fetched chunks buffered before they are written to the cache
+CACHE_FLUSH_INTERVAL = 1    # Seconds a fetched chunk may wait for a cache write, bounding what a crash loses
+
+# Result granularities: 'workspace' fetches daily analytics aggregated across campaigns with one
+# request per date chunk; 'campaign' fans out one request per campaign per date chunk
+GRANULARITIES = ('workspace', 'campaign')
+DEFAULT_GRANULARITY = 'workspace'
+
+# Endpoints whose largest workable date chunk is learned separately
+CAMPAIGN_ENDPOINT = "daily analytics per campaign"
+WORKSPACE_ENDPOINT = "daily analytics per workspace"
+
+# Campaign filter fields accepted in a job request, per job or per workspace
+FILTER_FIELDS = ('search', 'tag_ids', 'campaign_ids')
+
+class CampaignFilter:
+    """
+    The campaigns of a workspace a job covers. search and tag_ids are passed to the campaign
+    listing; campaign_ids keeps only the given campaigns, and without search or tag_ids the
+    listing is skipped altogether unless list_campaigns is set because the IDs may belong to
+    another workspace.
+    """
+
+    def __init__(self, search: Optional[str] = None, tag_ids: Optional[List[str]] = None,
+                 campaign_ids: Optional[List[str]] = None, list_campaigns: bool = False):
+        self.search = search or None
+        self.tag_ids = tag_ids or None
+        self.campaign_ids = list(dict.fromkeys(campaign_ids)) if campaign_ids else None
+        self.list_campaigns = list_campaigns
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]], defaults: Optional["CampaignFilter"] = None) -> "CampaignFilter":
+        """Build a filter from request JSON, falling back to defaults per field; raises ValueError for invalid values"""
+        data = data or {}
+        if not isinstance(data, dict):
+            raise ValueError("Campaign filters must be an object")
+        search = data.get('search')
+        if search is not None and not isinstance(search, str):
+            raise ValueError("search must be a string")
+        for field in ('tag_ids', 'campaign_ids'):
+            values = data.get(field)
+            if values is not None and (not isinstance(values, list) or not all(isinstance(v, str) and v for v in values)):
+                raise ValueError(f"{field} must be an array of strings")
+        defaults = defaults or cls()
+        return cls(
+            search if search is not None else defaults.search,
+            data['tag_ids'] if data.get('tag_ids') is not None else defaults.tag_ids,
+            data['campaign_ids'] if data.get('campaign_ids') is not None else defaults.campaign_ids
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.search or self.tag_ids or self.campaign_ids)
+
+    async def iter_pages(self, campaign_api: AsyncInstantlyCampaignAPI) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Pages of the campaigns this filter covers"""
+        if self.campaign_ids and not (self.search or self.tag_ids or self.list_campaigns):
+            # Explicit campaigns need no listing; without metadata their full range is fetched
+            yield [{"id": campaign_id} for campaign_id in self.campaign_ids]
+            return
+        wanted = set(self.campaign_ids) if self.campaign_ids else None
+        async for items in campaign_api.iter_campaign_pages(search=self.search, tag_ids=self.tag_ids):
+            yield [item for item in items if wanted is None or item.get("id") in wanted]
+
+def campaign_filters(api_keys: List[str], data: Dict[str, Any]) -> Dict[str, CampaignFilter]:
+    """
+    The campaign filter of each workspace of a job request. Job-level search, tag_ids and
+    campaign_ids apply to every workspace; workspace_filters maps API keys to fields that
+    override them. Campaign IDs belong to one workspace, so job-level campaign_ids of a job with
+    several workspaces are matched against each workspace's listing instead of being fetched
+    everywhere. Workspaces without any filter are left out. Raises ValueError for invalid values.
+    """
+    defaults = CampaignFilter.from_json({field: data.get(field) for field in FILTER_FIELDS})
+    overrides = data.get('workspace_filters') or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("workspace_filters must be an object keyed by API key")
+    unknown = set(overrides) - set(api_keys)
+    if unknown:
+        raise ValueError("workspace_filters has API keys that are not in api_keys")
+    filters = {api_key: CampaignFilter.from_json(overrides.get(api_key), defaults) for api_key in api_keys}
+    if len(set(api_keys)) > 1:
+        for api_key, campaign_filter in filters.items():
+            campaign_filter.list_campaigns = not (overrides.get(api_key) or {}).get('campaign_ids')
+    return {api_key: campaign_filter for api_key, campaign_filter in filters.items() if campaign_filter}
+
+# Error of a workspace whose job was cancelled or ran into its deadline
+STOPPED_ERROR = "Stopped before all analytics were fetched"
+
+# On-disk cache of daily analytics shared by all jobs
+analytics_cache = AnalyticsCache()
+
+# Threads for the blocking cache calls made by workspace coroutines
+blocking_executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_THREADS)
+
+def deferred_retries(fetch_unit: Callable[[Any, int], Awaitable], progress: Optional[JobProgress] = None) -> RetryPolicy:
+    """
+    Retry policy for run_sliding_window that sends units whose request raised DeferredRetry
+    again with fetch_unit(key, attempt) once their backoff has passed. The unit counts as
+    retrying in progress from its first deferral until a retry is no longer deferred.
+    """
+    deferred = set()  # Keys of the units counted as retrying
+    
+    def retry(key: Any, error: BaseException):
+        if not isinstance(error, DeferredRetry):
+            return None
+        if progress is not None and key not in deferred:
+            progress.retry_started()
+        deferred.add(key)
+
+        async def resend():
+            deferred_again = False
+            try:
+                return await fetch_unit(key, error.attempt)
+            except DeferredRetry:
+                deferred_again = True
+                raise
+            finally:
+                if not deferred_again:
+                    deferred.discard(key)
+                    if progress is not None:
+                        progress.retry_finished()
+        return error.delay, resend
+    return retry
+
+class CacheWriter:
+    """
+    Writes fresh upstream results of a workspace to the cache in the background, once
+    CACHE_WRITE_BATCH chunks are buffered or CACHE_FLUSH_INTERVAL has passed since the last write.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.workspace = workspace_key(api_key)
+        self._loop = asyncio.get_running_loop()
+        self._chunks = []
+        self._writes = []
+        self._last_flush = self._loop.time()
+
+    def add(self, campaign_id: str, chunk_start: str, chunk_end: str, result: List[Dict]):
+        self._chunks.append((campaign_id, chunk_start, chunk_end, result))
+        if len(self._chunks) >= CACHE_WRITE_BATCH or self._loop.time() - self._last_flush >= CACHE_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = self._loop.time()
+        if self._chunks:
+            self._writes.append(self._loop.run_in_executor(
+                blocking_executor, analytics_cache.store_chunks, self.workspace, self._chunks
+            ))
+            self._chunks = []
+
+    async def close(self):
+        """Write the buffered chunks and wait for every write to finish"""
+        self.flush()
+        for write in asyncio.as_completed(self._writes):
+            try:
+                await write
+            except Exception as e:
+                logger.warning(f"Failed to cache analytics for workspace (API key ending: ...{self.api_key[-4:]}): {str(e)}")
+
+async def process_campaign_batch(analytics_api: AsyncInstantlyCampaignAnalyticsAPI,
+                               campaign_chunks: AsyncIterator[Tuple[str, List[Tuple[str, str]]]],
+                               request_limit: asyncio.Semaphore,
+                               progress: Optional[JobProgress] = None) -> AsyncIterator[Tuple[str, Tuple[str, str], Any]]:
+    """
+    Process campaigns concurrently as they are discovered, yielding (campaign_id, chunk, result) tuples
+    as soon as each request finishes. campaign_chunks yields (campaign_id, date chunks) pairs and is
+    read while requests are in flight. A chunk the upstream can't handle is split into smaller ones.
+    A failed request gives up its slots and is retried later from the window's retry queue.
+    """
+    logger.info(f"Starting batch processing (API key ending: ...{analytics_api.api_key[-4:]})")
+    planner = get_chunk_planner(CAMPAIGN_ENDPOINT)
+    
+    async def fetch_limited(campaign_id: str, chunk_start: str, chunk_end: str, attempt: int = 0) -> List[Dict]:
+        async def fetch(start: str, end: str) -> List[Dict]:
+            # Parts of a split chunk are retried in place; the planned chunk goes to the retry queue
+            planned_chunk = (start, end) == (chunk_start, chunk_end)
+            # Every request also takes a slot from the job-wide budget shared by all workspaces
+            async with request_limit:
+                return await analytics_api.get_daily_campaign_analytics(
+                    campaign_id=campaign_id,
+                    start_date=start,
+                    end_date=end,
+                    attempt=attempt if planned_chunk else 0,
+                    defer_retries=planned_chunk
+                )
+        return await planner.fetch(fetch, chunk_start, chunk_end)
+    
+    def retry_chunk(key: Tuple[str, Tuple[str, str]], attempt: int) -> Awaitable[List[Dict]]:
+        campaign_id, (chunk_start, chunk_end) = key
+        return fetch_limited(campaign_id, chunk_start, chunk_end, attempt)
+    
+    async def campaign_tasks():
+        # Coroutines are created lazily, one per free concurrency slot
+        async for campaign_id, date_chunks in campaign_chunks:
+            for chunk_start, chunk_end in date_chunks:
+                task = fetch_limited(campaign_id, chunk_start, chunk_end)
+                yield (campaign_id, (chunk_start, chunk_end)), task
+    
+    # Keep MAX_CONCURRENT_REQUESTS requests in flight for this key until every task is done
+    processed = 0
+    async for (campaign_id, chunk), result in run_sliding_window(
+            campaign_tasks(), MAX_CONCURRENT_REQUESTS, label="requests",
+            retry=deferred_retries(retry_chunk, progress)):
+        processed += 1
+        if progress is not None:
+            progress.task_done(analytics_api.api_key, failed=isinstance(result, Exception))
+        yield campaign_id, chunk, result
+        
+    logger.info(f"Batch processing completed. Total tasks processed: {processed}")
+
+async def process_workspace(session: aiohttp.ClientSession, api_key: str, start_date: str, end_date: str,
+                            results: Dict, request_limit: asyncio.Semaphore,
+                            on_event: Optional[EventCallback] = None,
+                            progress: Optional[JobProgress] = None,
+                            campaign_filter: Optional[CampaignFilter] = None,
+                            cached_after: Optional[float] = None) -> Dict:
+    """
+    Fetch and aggregate analytics for a single workspace, or only its campaigns matching campaign_filter.
+    Each result is folded into the workspace's matrix as soon as it arrives, and a campaign event is
+    emitted once all chunks of a campaign are in. The workspace is readable from results['data']
+    while it runs.
+    """
+    loop = asyncio.get_running_loop()
+    matrix = SendMatrix(start_date, end_date)
+    workspace_data = {
+        "campaigns": matrix,
+        "total_sent": 0,
+        "error": None
+    }
+    results['data'][api_key] = workspace_data
+    
+    campaign_api = AsyncInstantlyCampaignAPI(api_key, session, progress=progress)
+    analytics_api = AsyncInstantlyCampaignAnalyticsAPI(api_key, session, progress=progress)
+    workspace = workspace_key(api_key)
+    cached_days = await loop.run_in_executor(
+        blocking_executor, analytics_cache.get_workspace_days, workspace, start_date, end_date, cached_after
+    )
+    
+    planned = {'requests': 0, 'cached_campaigns': 0, 'inactive_campaigns': 0}
+    pending_chunks = {}  # Campaign ID -> number of chunks still in flight
+    
+    def emit_campaign(campaign_id: str):
+        if on_event is not None:
+            on_event(campaign_event(api_key, campaign_id))
+    
+    async def campaign_chunks():
+        # Each page of campaigns is planned and queued for fetching while the next page loads
+        pages = (campaign_filter or CampaignFilter()).iter_pages(campaign_api)
+        async for items in prefetch(pages, CAMPAIGN_PAGE_PREFETCH):
+            for metadata in [campaign_metadata(item) for item in items if "id" in item]:
+                campaign_id = metadata["id"]
+                if campaign_id in matrix:
+                    continue
+                matrix.set_metadata(campaign_id, metadata)
+                days = cached_days.pop(campaign_id, {})
+                matrix.add_days(campaign_id, [day for day in days.values() if day is not None])
+                # Only the days between the campaign's creation and its pause or completion can have sends
+                active_range = active_date_range(metadata, start_date, end_date)
+                if active_range is None:
+                    planned['inactive_campaigns'] += 1
+                    emit_campaign(campaign_id)
+                    continue
+                # Plan calendar-aligned chunks covering only the active days missing from the cache
+                chunks = get_chunk_planner(CAMPAIGN_ENDPOINT).split(*active_range, days)
+                if not chunks:
+                    planned['cached_campaigns'] += 1
+                    emit_campaign(campaign_id)
+                    continue
+                planned['requests'] += len(chunks)
+                pending_chunks[campaign_id] = len(chunks)
+                if progress is not None:
+                    progress.tasks_planned(api_key, len(chunks))
+                yield campaign_id, chunks
+        if progress is not None:
+            progress.listing_done(api_key)
+    
+    cache_writer = CacheWriter(api_key)
+    
+    def add_totals():
+        # Workspace and combined totals are reductions over the matrix
+        workspace_data["total_sent"] = matrix.total()
+        for date, sends in matrix.daily_totals().items():
+            results['daily_totals'][date] = results['daily_totals'].get(date, 0) + sends
+        results['total_sends'] += workspace_data["total_sent"]
+    
+    # Fetch campaign IDs and analytics concurrently, folding each result in as it completes
+    try:
+        logger.info(f"Fetching campaigns and analytics for workspace (API key ending: ...{api_key[-4:]})")
+        async for campaign_id, (chunk_start, chunk_end), result in process_campaign_batch(
+                analytics_api, campaign_chunks(), request_limit, progress):
+            if isinstance(result, Exception):
+                logger.warning(f"Error in batch request for campaign {campaign_id} ({chunk_start} to {chunk_end}): {str(result)}")
+                matrix.set_error(campaign_id, f"Failed to fetch analytics: {str(result)}")
+            else:
+                try:
+                    matrix.add_days(campaign_id, result)
+                    cache_writer.add(campaign_id, chunk_start, chunk_end, result)
+                except Exception as e:
+                    logger.warning(f"Error processing result for campaign {campaign_id}: {str(e)}")
+            
+            pending_chunks[campaign_id] -= 1
+            if not pending_chunks[campaign_id]:
+                del pending_chunks[campaign_id]
+                emit_campaign(campaign_id)
+                
+        logger.info(f"Found {len(matrix)} campaigns for workspace (API key ending: ...{api_key[-4:]}), "
+                    f"made {planned['requests']} upstream requests ({planned['cached_campaigns']} campaigns fully cached, "
+                    f"{planned['inactive_campaigns']} inactive in the date range)")
+    except asyncio.CancelledError:
+        # Keep what was aggregated before the job was stopped
+        workspace_data["error"] = STOPPED_ERROR
+        add_totals()
+        raise
+    except Exception as e:
+        # Keep the analytics fetched before the failure; campaigns still in flight are incomplete
+        error_msg = f"Failed to fetch campaign IDs: {str(e)}"
+        logger.error(f"Workspace (API key ending: ...{api_key[-4:]}) - {error_msg}")
+        workspace_data["error"] = error_msg
+        for campaign_id in list(pending_chunks):
+            matrix.set_error(campaign_id, error_msg)
+            del pending_chunks[campaign_id]
+            emit_campaign(campaign_id)
+    finally:
+        await cache_writer.close()
+    
+    add_totals()
+    return workspace_data
+
+async def process_workspace_totals(session: aiohttp.ClientSession, api_key: str, start_date: str, end_date: str,
+                                   results: Dict, request_limit: asyncio.Semaphore,
+                                   progress: Optional[JobProgress] = None,
+                                   cached_after: Optional[float] = None) -> Dict:
+    """Fetch daily analytics aggregated across all campaigns of a workspace, one request per date chunk"""
+    loop = asyncio.get_running_loop()
+    workspace_data = {
+        "campaigns": SendMatrix(start_date, end_date),
+        "daily_sends": {},
+        "total_sent": 0,
+        "error": None
+    }
+    results['data'][api_key] = workspace_data
+    
+    analytics_api = AsyncInstantlyCampaignAnalyticsAPI(api_key, session, progress=progress)
+    workspace = workspace_key(api_key)
+    cached_days = await loop.run_in_executor(
+        blocking_executor, analytics_cache.get_workspace_days, workspace, start_date, end_date, cached_after
+    )
+    cached_days = cached_days.get(ALL_CAMPAIGNS, {})
+    
+    # A single row holds the workspace-wide days, so totals use the same reductions as campaigns
+    totals = SendMatrix(start_date, end_date)
+    totals.add_days(ALL_CAMPAIGNS, [day for day in cached_days.values() if day is not None])
+    planner = get_chunk_planner(WORKSPACE_ENDPOINT)
+    chunks = planner.split(start_date, end_date, cached_days)
+    if progress is not None:
+        progress.tasks_planned(api_key, len(chunks))
+        progress.listing_done(api_key)
+    
+    def fetch_limited(chunk_start: str, chunk_end: str, attempt: int = 0) -> Awaitable[List[Dict]]:
+        async def fetch(start: str, end: str) -> List[Dict]:
+            # Parts of a split chunk are retried in place; the planned chunk goes to the retry queue
+            planned_chunk = (start, end) == (chunk_start, chunk_end)
+            async with request_limit:
+                return await analytics_api.get_daily_campaign_analytics(
+                    None, start, end, attempt=attempt if planned_chunk else 0, defer_retries=planned_chunk
+                )
+        return planner.fetch(fetch, chunk_start, chunk_end)
+    
+    def retry_chunk(chunk: Tuple[str, str], attempt: int) -> Awaitable[List[Dict]]:
+        return fetch_limited(*chunk, attempt)
+    
+    def add_totals():
+        workspace_data["daily_sends"] = totals.daily_totals()
+        workspace_data["total_sent"] = totals.total()
+        for date, sends in workspace_data["daily_sends"].items():
+            results['daily_totals'][date] = results['daily_totals'].get(date, 0) + sends
+        results['total_sends'] += workspace_data["total_sent"]
+    
+    logger.info(f"Fetching workspace analytics in {len(chunks)} requests (API key ending: ...{api_key[-4:]})")
+    cache_writer = CacheWriter(api_key)
+    tasks = (((chunk_start, chunk_end), fetch_limited(chunk_start, chunk_end)) for chunk_start, chunk_end in chunks)
+    try:
+        async for (chunk_start, chunk_end), result in run_sliding_window(
+                tasks, MAX_CONCURRENT_REQUESTS, len(chunks), "requests", deferred_retries(retry_chunk, progress)):
+            if progress is not None:
+                progress.task_done(api_key, failed=isinstance(result, Exception))
+            if isinstance(result, Exception):
+                logger.warning(f"Error fetching workspace analytics ({chunk_start} to {chunk_end}): {str(result)}")
+                workspace_data["error"] = f"Failed to fetch analytics: {str(result)}"
+                continue
+            totals.add_days(ALL_CAMPAIGNS, result)
+            cache_writer.add(ALL_CAMPAIGNS, chunk_start, chunk_end, result)
+    except asyncio.CancelledError:
+        # Keep what was aggregated before the job was stopped
+        workspace_data["error"] = STOPPED_ERROR
+        add_totals()
+        raise
+    finally:
+        await cache_writer.close()
+    
+    add_totals()
+    return workspace_data
+
+async def process_workspaces(session: aiohttp.ClientSession, api_keys: List[str], start_date: str,
+                             end_date: str, results: Dict, on_event: Optional[EventCallback] = None,
+                             progress: Optional[JobProgress] = None, granularity: str = DEFAULT_GRANULARITY,
+                             filters: Optional[Dict[str, CampaignFilter]] = None,
+                             cached_after: Optional[float] = None):
+    """
+    Process all workspaces concurrently under one global request budget.
+    With granularity 'workspace', only workspace-wide daily sends are fetched and no campaign
+    records are produced; 'campaign' fetches and aggregates every campaign.
+    filters maps API keys to the campaigns to cover (see campaign_filters). The workspace-wide
+    endpoint can't filter, so filtered workspaces are always fetched per campaign; with
+    granularity 'workspace' they also get daily_sends summed over the matching campaigns.
+    Still-mutable cached days fetched after cached_after are reused, so a resumed job doesn't
+    fetch again what its interrupted run already fetched.
+    Workspace results are written into results['data'] and combined totals into
+    results['daily_totals'] / results['total_sends'] as each workspace finishes.
+    If given, on_event receives a 'campaign' event per campaign, a 'workspace' record per
+    workspace and a final 'totals' record as soon as each of them is aggregated. Campaign
+    events only name the campaign; RecordBuilder reads its record from the workspace's matrix.
+    results['completion'] follows the campaign x chunk tasks counted by progress.
+    If the job is cancelled, unfinished workspaces keep what they aggregated so far with
+    STOPPED_ERROR, their records and the totals are emitted, and CancelledError is re-raised.
+    """
+    request_limit = asyncio.Semaphore(MAX_GLOBAL_REQUESTS)
+    filters = filters or {}
+    progress = progress or JobProgress()
+    for api_key in api_keys:
+        progress.add_workspace(api_key)
+    
+    def update_completion():
+        results['completion'] = progress.completion
+    progress.subscribe(update_completion)
+    
+    finished = set()
+    
+    async def run_workspace(api_key: str):
+        try:
+            if granularity == 'workspace' and api_key not in filters:
+                workspace_data = await process_workspace_totals(session, api_key, start_date, end_date, results,
+                                                                request_limit, progress, cached_after)
+            else:
+                workspace_data = await process_workspace(session, api_key, start_date, end_date, results,
+                                                         request_limit, on_event, progress, filters.get(api_key),
+                                                         cached_after)
+                if granularity == 'workspace':
+                    workspace_data["daily_sends"] = workspace_matrix(workspace_data).daily_totals()
+        except Exception as e:
+            workspace_data = {
+                "campaigns": SendMatrix(start_date, end_date),
+                "total_sent": 0,
+                "error": f"Workspace error: {str(e)}"
+            }
+        results['data'][api_key] = workspace_data
+        finished.add(api_key)
+        progress.workspace_done(api_key)
+        update_completion()
+        
+        if on_event is not None:
+            on_event(workspace_record(api_key, workspace_data))
+    
+    try:
+        await asyncio.gather(*(run_workspace(api_key) for api_key in api_keys))
+    except asyncio.CancelledError:
+        for api_key in api_keys:
+            if api_key in finished:
+                continue
+            # Workspaces that never started have nothing aggregated
+            workspace_data = results['data'].setdefault(api_key, {
+                "campaigns": SendMatrix(start_date, end_date),
+                "total_sent": 0,
+                "error": None
+            })
+            workspace_data["error"] = workspace_data["error"] or STOPPED_ERROR
+            if on_event is not None:
+                on_event(workspace_record(api_key, workspace_data))
+        if on_event is not None:
+            on_event(totals_record(results))
+        raise
+    
+    if on_event is not None:
+        on_event(totals_record(results))
+
+async def run_until_deadline(job: Awaitable, deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Await a job such as process_workspaces(), stopping it after deadline seconds if given.
+    Returns 'deadline' if the job was stopped, in which case results hold its partial aggregates.
+    """
+    if deadline is None:
+        await job
+        return None
+    try:
+        await asyncio.wait_for(job, max(deadline, 0))
+    except asyncio.TimeoutError:
+        return 'deadline'
+    return None
+
+def totals_record(results: Dict) -> Dict[str, Any]:
+    """The final 'totals' record of a job"""
+    return {
+        "type": "totals",
+        "daily_totals": dict(sorted(results['daily_totals'].items())),
+        "total_sends": results['total_sends']
+    }
+
+def workspace_record(api_key: str, workspace_data: Dict) -> Dict[str, Any]:
+    """The 'workspace' record of a finished workspace"""
+    record = {
+        "type": "workspace",
+        "workspace": api_key,
+        "total_sent": workspace_data["total_sent"],
+        "campaign_count": len(workspace_matrix(workspace_data)),
+        "error": workspace_data["error"]
+    }
+    if "daily_sends" in workspace_data:
+        record["daily_sends"] = workspace_data["daily_sends"]
+    return record
+
+def workspace_result(workspace_data: Dict, campaign_analytics: Dict[str, Dict],
+                     total_sent: Optional[int] = None) -> Dict[str, Any]:
+    """A workspace's results in the API's JSON shape, with the given campaign analytics"""
+    result = {
+        "campaign_analytics": campaign_analytics,
+        "total_sent": workspace_data["total_sent"] if total_sent is None else total_sent,
+        "error": workspace_data["error"]
+    }
+    if "daily_sends" in workspace_data:
+        result["daily_sends"] = workspace_data["daily_sends"]
+    return result
+
+def result_data(data: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Build the per-workspace results in the API's JSON shape from the aggregated matrices"""
+    return {
+        api_key: workspace_result(workspace_data, workspace_matrix(workspace_data).campaign_analytics())
+        for api_key, workspace_data in data.items()
+    }
+
+def campaign_event(api_key: str, campaign_id: str) -> Dict[str, Any]:
+    """The 'campaign' event of a finished campaign, expanded into its record by RecordBuilder"""
+    return {"type": "campaign", "workspace": api_key, "campaign_id": campaign_id}
+
+def workspace_events(api_key: str, workspace_data: Dict) -> Iterator[Dict[str, Any]]:
+    """The 'campaign' events and the 'workspace' record of a finished workspace"""
+    for campaign_id in workspace_matrix(workspace_data).campaign_ids:
+        yield campaign_event(api_key, campaign_id)
+    yield workspace_record(api_key, workspace_data)
+
+def result_events(results: Dict) -> Iterator[Dict[str, Any]]:
+    """Rebuild the events process_workspaces emits from the aggregated results of a finished job"""
+    for api_key, workspace_data in results['data'].items():
+        yield from workspace_events(api_key, workspace_data)
+    yield totals_record(results)
+
+class RecordBuilder:
+    """
+    Turns the events of a job into the records sent to clients. A campaign's record is read
+    from its workspace's matrix only when it is sent, so a job holds no records of its own.
+    """
+
+    def __init__(self, results: Dict):
+        self.results = results
+        self._matrices: Dict[str, Tuple[Any, SendMatrix]] = {}  # API key -> (stored campaigns, matrix)
+
+    def record(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The record of an event, or None if its campaign is no longer in the results"""
+        if event["type"] != "campaign":
+            return event
+        api_key = event["workspace"]
+        workspace_data = self.results['data'].get(api_key)
+        if workspace_data is None:
+            return None
+        # A finished job stores its matrices as JSON; parse each one once per client
+        campaigns = workspace_data["campaigns"]
+        cached = self._matrices.get(api_key)
+        if cached is None or cached[0] is not campaigns:
+            cached = self._matrices[api_key] = (campaigns, workspace_matrix(workspace_data))
+        matrix = cached[1]
+        if event["campaign_id"] not in matrix:
+            return None
+        return {**event, **matrix.campaign_record(event["campaign_id"])}
+
+def restore_workspace(results: Dict, api_key: str, workspace_data: Dict):
+    """Add a workspace result saved by an interrupted run of a job to its results and totals"""
+    matrix = workspace_matrix(workspace_data)
+    workspace_data["campaigns"] = matrix
+    results['data'][api_key] = workspace_data
+    daily_sends = workspace_data.get("daily_sends") or matrix.daily_totals()
+    for date, sends in daily_sends.items():
+        results['daily_totals'][date] = results['daily_totals'].get(date, 0) + sends
+    results['total_sends'] += workspace_data["total_sent"]
+
+def encode_stream_record(record: Dict, sse: bool = False) -> str:
+    """Encode a pipeline event as an NDJSON line or, if sse is set, as a Server-Sent Event"""
+    data = json.dumps(record)
+    if sse:
+        return f"event: {record.get('type', 'message')}\ndata: {data}\n\n"
+    return f"{data}\n"
@@ -1,104 +1,129 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-from instantly_campaign_api import InstantlyCampaignAPI
-from instantly_campaign_analytics_api import InstantlyCampaignAnalyticsAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
+from datetime import datetime
+from contextlib import asynccontextmanager
+from analytics_pipeline import (process_workspaces, encode_stream_record, result_data, campaign_filters,
+                                run_until_deadline, RecordBuilder, DEFAULT_GRANULARITY)
+from async_runtime import create_client_session
+from rate_limiter import rate_limiters
+import asyncio
+import aiohttp
 import uvicorn
 
-app = FastAPI()
+# Pooled HTTP session shared by every request handled by this worker
+http_session: Optional[aiohttp.ClientSession] = None
 
-class AnalyticsRequest(BaseModel):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_session
+    http_session = create_client_session()
+    try:
+        yield
+    finally:
+        await http_session.close()
+        # Keep the learned per-key request rates across restarts
+        rate_limiters.save()
+
+app = FastAPI(lifespan=lifespan)
+
+class CampaignFilterRequest(BaseModel):
+    search: Optional[str] = None              # Campaign name search
+    tag_ids: Optional[List[str]] = None       # Campaign tag IDs
+    campaign_ids: Optional[List[str]] = None  # Explicit campaigns
+
+class AnalyticsRequest(CampaignFilterRequest):
     api_keys: List[str]
     start_date: str  # YYYY-MM-DD
     end_date: str    # YYYY-MM-DD
+    granularity: Literal['workspace', 'campaign'] = DEFAULT_GRANULARITY
+    workspace_filters: Dict[str, CampaignFilterRequest] = {}  # Per API key, overriding the fields above
+    deadline: Optional[float] = Field(None, gt=0)  # Seconds after which partial results are returned
 
-def split_date_range(start_date: str, end_date: str) -> List[tuple]:
-    """Split date range into 7-day chunks"""
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    chunks = []
-    
-    current = start
-    while current < end:
-        chunk_end = min(current + timedelta(days=6), end)
-        chunks.append((
-            current.strftime('%Y-%m-%d'),
-            chunk_end.strftime('%Y-%m-%d')
-        ))
-        current = chunk_end + timedelta(days=1)
-    
-    return chunks
+def request_filters(request: AnalyticsRequest, api_keys: List[str]):
+    try:
+        return campaign_filters(api_keys, request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/analytics/bulk")
 async def get_bulk_analytics(request: AnalyticsRequest) -> Dict[str, Any]:
-    results = {}
-    
-    for api_key in request.api_keys:
-        try:
-            workspace_data = {
-                "campaign_analytics": {},
-                "total_sent": 0,
-                "error": None
-            }
-            
-            # Get all campaign IDs for this workspace
-            campaign_api = InstantlyCampaignAPI(api_key)
-            analytics_api = InstantlyCampaignAnalyticsAPI(api_key)
-            
-            try:
-                campaign_ids = campaign_api.get_campaign_ids()
-            except Exception as e:
-                workspace_data["error"] = f"Failed to fetch campaign IDs: {str(e)}"
-                results[api_key] = workspace_data
-                continue
-                
-            # Split date range into 7-day chunks
-            date_chunks = split_date_range(request.start_date, request.end_date)
-            
-            # Get analytics for each campaign
-            for campaign_id in campaign_ids:
-                campaign_data = {
-                    "daily_sends": {},
-                    "total_sent": 0,
-                    "error": None
-                }
-                
-                try:
-                    # Get analytics for each date chunk
-                    for chunk_start, chunk_end in date_chunks:
-                        analytics = analytics_api.get_daily_campaign_analytics(
-                            campaign_id=campaign_id,
-                            start_date=chunk_start,
-                            end_date=chunk_end
-                        )
-                        
-                        # Process analytics data
-                        for day in analytics:
-                            date = day['date']
-                            sends = day['sent']
-                            campaign_data["daily_sends"][date] = sends
-                            campaign_data["total_sent"] += sends
-                            workspace_data["total_sent"] += sends
-                            
-                except Exception as e:
-                    campaign_data["error"] = f"Failed to fetch analytics: {str(e)}"
-                
-                workspace_data["campaign_analytics"][campaign_id] = campaign_data
-                
-            results[api_key] = workspace_data
-            
-        except Exception as e:
-            results[api_key] = {
-                "campaign_analytics": {},
-                "total_sent": 0,
-                "error": f"Workspace error: {str(e)}"
-            }
-    
-    return {
+    results = {
+        'data': {},
+        'daily_totals': {},
+        'total_sends': 0,
+        'completion': 0
+    }
+
+    try:
+        datetime.strptime(request.start_date, '%Y-%m-%d')
+        datetime.strptime(request.end_date, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    # Fetch every workspace concurrently on this worker's event loop; other requests keep being served
+    api_keys = list(dict.fromkeys(request.api_keys))
+    stop_reason = await run_until_deadline(
+        process_workspaces(http_session, api_keys, request.start_date, request.end_date, results,
+                           granularity=request.granularity, filters=request_filters(request, api_keys)),
+        request.deadline
+    )
+
+    response = {
         "status": "success",
-        "data": results
+        "data": result_data(results['data']),
+        "daily_totals": dict(sorted(results['daily_totals'].items())),
+        "total_sends": results['total_sends']
+    }
+    if stop_reason is not None:
+        response["stop_reason"] = stop_reason
+    return response
+
+@app.post("/analytics/bulk/stream")
+async def stream_bulk_analytics(request: AnalyticsRequest, http_request: Request, format: Optional[str] = None):
+    """Stream per-campaign, per-workspace and final totals records as NDJSON or SSE"""
+    try:
+        datetime.strptime(request.start_date, '%Y-%m-%d')
+        datetime.strptime(request.end_date, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    sse = format == 'sse' or 'text/event-stream' in http_request.headers.get('accept', '')
+    results = {
+        'data': {},
+        'daily_totals': {},
+        'total_sends': 0,
+        'completion': 0
     }
+    records = asyncio.Queue()
+    api_keys = list(dict.fromkeys(request.api_keys))
+    filters = request_filters(request, api_keys)
+    job = asyncio.ensure_future(run_until_deadline(
+        process_workspaces(http_session, api_keys, request.start_date, request.end_date, results, records.put_nowait,
+                           granularity=request.granularity, filters=filters),
+        request.deadline
+    ))
+    job.add_done_callback(lambda _: records.put_nowait(None))
+    builder = RecordBuilder(results)
+
+    async def generate():
+        try:
+            while True:
+                event = await records.get()
+                if event is None:
+                    break
+                record = builder.record(event)
+                if record is not None:
+                    yield encode_stream_record(record, sse)
+            if job.exception() is not None:
+                yield encode_stream_record({"type": "error", "error": str(job.exception())}, sse)
+        finally:
+            # Stop fetching if the client went away before the job finished
+            job.cancel()
+
+    media_type = 'text/event-stream' if sse else 'application/x-ndjson'
+    return StreamingResponse(generate(), media_type=media_type, headers={'Cache-Control': 'no-cache'})
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, get_host_breaker
+from job_progress import JobProgress
+from rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Retry policy shared by every async request to the upstream
+MAX_RETRIES = 5              # Maximum number of retries for failed requests
+BASE_DELAY = 1              # Base delay for exponential backoff (seconds)
+MAX_DELAY = 32             # Maximum delay for exponential backoff (seconds)
+RETRYABLE_STATUSES = {408, 429}  # Client errors worth retrying; 5xx responses are always retried
+AUTH_STATUSES = {401, 403}       # The upstream rejected the API key
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed request may succeed if sent again (429, 5xx, network errors)"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, aiohttp.ContentTypeError):
+        return True  # A non-JSON body, e.g. an error page from a proxy
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status in RETRYABLE_STATUSES
+    return isinstance(error, aiohttp.ClientError)
+
+
+class DeferredRetry(Exception):
+    """
+    A request failed with a retryable error and should be sent again after delay seconds,
+    resuming at attempt, instead of waiting inside the task that sent it (see fetch_with_retry)
+    """
+
+    def __init__(self, reason: str, delay: float, attempt: int):
+        super().__init__(f"{reason}; retrying in {delay:.2f} seconds (attempt {attempt + 1}/{MAX_RETRIES})")
+        self.delay = delay
+        self.attempt = attempt
+
+
+async def fetch_with_retry(session: aiohttp.ClientSession, url: str, headers: Dict, params: Dict,
+                           limiter: Optional[AdaptiveRateLimiter] = None,
+                           progress: Optional[JobProgress] = None,
+                           breaker: Optional[CircuitBreaker] = None,
+                           attempt: int = 0, defer_retries: bool = False) -> Dict:
+    """
+    Fetch data with rate limiting and exponential backoff retry logic.
+    Only retryable errors (see is_retryable) are retried; other 4xx responses fail at once.
+    breaker is the circuit breaker of the API key, which 401/403 responses open at once;
+    the host's breaker is used as well. While a breaker is open because requests keep failing,
+    the request waits for it without using up an attempt; a key the upstream rejected raises
+    CircuitOpenError. Failures count against the breakers once per campaign (see CircuitBreaker.record).
+    With defer_retries, a failure that would be retried raises DeferredRetry instead of sleeping,
+    so the caller can free its concurrency slot and send it again later from attempt.
+    """
+    host_breaker = get_host_breaker(url)
+    breakers = [breaker, host_breaker] if breaker is not None else [host_breaker]
+    resource = params.get("campaign_id")
+    retrying = False
+    
+    def start_retry():
+        nonlocal retrying
+        if progress is not None and not retrying:
+            progress.retry_started()
+        retrying = True
+    
+    async def wait_for_circuits() -> List[CircuitBreaker]:
+        # Returns the half-open breakers this request is the probe of
+        while True:
+            probes = []
+            try:
+                # Every breaker is checked before any probe is claimed, so an open host breaker
+                # doesn't leave the key's probe held by a request that is never sent
+                for circuit in breakers:
+                    circuit.check()
+                for circuit in breakers:
+                    if circuit.claim():
+                        probes.append(circuit)
+                return probes
+            except CircuitOpenError as e:
+                for circuit in probes:
+                    circuit.release()
+                if e.tripped:
+                    raise
+                # The upstream is failing, not this request; wait for the breaker instead of failing
+                if defer_retries:
+                    raise DeferredRetry(str(e), e.retry_in, attempt)
+                start_retry()
+                await asyncio.sleep(e.retry_in)
+        
+    try:
+        for attempt in range(attempt, MAX_RETRIES):
+            probes = []
+            try:
+                probes = await wait_for_circuits()
+                if limiter is not None:
+                    await limiter.acquire()
+                logger.debug(f"Making request to {url} (attempt {attempt + 1}/{MAX_RETRIES})")
+                started = time.monotonic()
+                async with session.get(url, headers=headers, params=params) as response:
+                    if limiter is not None:
+                        limiter.record_response(response.status, response.headers, time.monotonic() - started)
+                    if progress is not None:
+                        progress.record_request(response.status)
+                    if breaker is not None and response.status in AUTH_STATUSES:
+                        # A revoked key stays revoked; short-circuit every other request with it
+                        breaker.trip()
+                    else:
+                        for circuit in breakers:
+                            circuit.record(response.status >= 500, resource)
+                        probes.clear()
+                        
+                    if response.status == 429:  # Too Many Requests
+                        if defer_retries and attempt < MAX_RETRIES - 1:
+                            blocked_for = limiter.blocked_for() if limiter is not None else 0
+                            delay = blocked_for or min(BASE_DELAY * (2 ** attempt) + random.uniform(0, 1), MAX_DELAY)
+                            logger.warning(f"Rate limited on {url}. Deferring retry by {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
+                            raise DeferredRetry("Rate limited", delay, attempt + 1)
+                        start_retry()
+                        if limiter is not None and limiter.blocked_for() > 0:
+                            # The limiter holds back every request on this key until the upstream allows it
+                            logger.warning(f"Rate limited on {url}. Upstream asked to wait {limiter.blocked_for():.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
+                            continue
+                        delay = min(BASE_DELAY * (2 ** attempt) + random.uniform(0, 1), MAX_DELAY)
+                        logger.warning(f"Rate limited on {url}. Retrying in {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
+                        await asyncio.sleep(delay)
+                        continue
+                        
+                    response.raise_for_status()
+                    logger.debug(f"Successfully fetched data from {url}")
+                    return await response.json()
+                    
+            except CircuitOpenError:
+                raise
+            except aiohttp.ClientError as e:
+                if not isinstance(e, aiohttp.ClientResponseError):
+                    # No response arrived at all
+                    if progress is not None:
+                        progress.record_request(None)
+                    for circuit in breakers:
+                        circuit.record(True, resource)
+                    probes.clear()
+                if not is_retryable(e):
+                    logger.warning(f"Request to {url} failed and will not be retried: {str(e)}")
+                    raise
+                if attempt == MAX_RETRIES - 1:
+                    logger.error(f"Failed to fetch data from {url} after {MAX_RETRIES} attempts: {str(e)}")
+                    raise
+                delay = min(BASE_DELAY * (2 ** attempt) + random.uniform(0, 1), MAX_DELAY)
+                if defer_retries:
+                    logger.warning(f"Request to {url} failed. Deferring retry by {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
+                    raise DeferredRetry(str(e), delay, attempt + 1)
+                start_retry()
+                logger.warning(f"Request to {url} failed. Retrying in {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
+                await asyncio.sleep(delay)
+            finally:
+                # A probe that got no answer (cancelled, timed out, or the key was revoked) would
+                # otherwise hold its breaker until PROBE_TIMEOUT
+                for circuit in probes:
+                    circuit.release()
+                
+        error_msg = f"Max retries ({MAX_RETRIES}) exceeded for {url}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    finally:
+        if progress is not None and retrying:
+            progress.retry_finished()
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Configuration for the shared HTTP connection pool
+CONNECTION_LIMIT = 100          # Maximum number of open connections across all hosts
+CONNECTION_LIMIT_PER_HOST = 50  # Maximum number of open connections to api.instantly.ai
+DNS_CACHE_TTL = 300             # Seconds to cache DNS lookups
+KEEPALIVE_TIMEOUT = 60          # Seconds to keep idle connections open for reuse
+CONNECT_TIMEOUT = 10            # Seconds to wait for a connection (including TLS handshake)
+READ_TIMEOUT = 60               # Seconds to wait for data from an open connection
+
+
+def create_client_session() -> aiohttp.ClientSession:
+    """Create an aiohttp session with a tuned keep-alive connection pool; call it from a running loop"""
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=CONNECT_TIMEOUT,
+        sock_read=READ_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+class AsyncRuntime:
+    """
+    A long-lived event loop running in a background thread, with one pooled aiohttp session.
+
+    Synchronous code (Flask views, job threads) submits coroutines with submit() or run().
+    All of them share the loop and the session, so connections, DNS lookups and TLS
+    sessions to the upstream are reused across jobs.
+    """
+
+    def __init__(self, name: str = "async-runtime"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background event loop if it is not running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name=self.name, daemon=True)
+            self._thread.start()
+            logger.info(f"Started {self.name} event loop thread")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the runtime loop and return a concurrent.futures.Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the runtime loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Get the shared session; must be awaited from the runtime loop"""
+        if self._session is None or self._session.closed:
+            self._session = create_client_session()
+        return self._session
+
+    def stop(self, timeout: float = 5):
+        """Close the shared session and stop the background loop"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            if self._session is not None and not self._session.closed:
+                try:
+                    asyncio.run_coroutine_threadsafe(self._session.close(), self.loop).result(timeout)
+                except Exception as e:
+                    logger.warning(f"Failed to close shared HTTP session: {str(e)}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self.loop.close()
+            self._thread = None
+            self._session = None
+            logger.info(f"Stopped {self.name} event loop thread")
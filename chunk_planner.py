@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Configuration for date chunking
+CHUNK_UNITS = ('year', 'quarter', 'month', 'week', 'day')   # Calendar units, largest first
+MAX_CHUNK_UNIT = os.environ.get('MAX_CHUNK_UNIT', 'quarter')  # Largest chunk tried on an endpoint
+SHRINK_AFTER_FAILURES = 3      # Failed chunks of one unit before an endpoint starts with the next smaller unit
+GROW_AFTER_SUCCESSES = 500     # Successful chunks before a shrunken endpoint tries a larger unit again
+MAX_RESPONSE_DAYS = 100        # Responses this long may be capped by the upstream and are split to be safe
+SPLIT_STATUSES = {413, 414}    # Statuses that mean the range was too large; other errors are not split
+
+
+def unit_start(date: datetime, unit: str) -> datetime:
+    """Start of the calendar unit containing date; weeks start on Monday"""
+    if unit == 'year':
+        return date.replace(month=1, day=1)
+    if unit == 'quarter':
+        return date.replace(month=3 * ((date.month - 1) // 3) + 1, day=1)
+    if unit == 'month':
+        return date.replace(day=1)
+    if unit == 'week':
+        return date - timedelta(days=date.weekday())
+    return date
+
+
+def next_unit_start(start: datetime, unit: str) -> datetime:
+    """Start of the calendar unit following the one that begins at start"""
+    if unit == 'year':
+        return start.replace(year=start.year + 1)
+    if unit in ('quarter', 'month'):
+        months = 3 if unit == 'quarter' else 1
+        month = start.month - 1 + months
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+    if unit == 'week':
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+
+def smaller_unit(unit: str) -> Optional[str]:
+    index = CHUNK_UNITS.index(unit)
+    return CHUNK_UNITS[index + 1] if index + 1 < len(CHUNK_UNITS) else None
+
+
+def larger_unit(unit: str) -> Optional[str]:
+    index = CHUNK_UNITS.index(unit)
+    return CHUNK_UNITS[index - 1] if index > 0 else None
+
+
+def split_date_range(start_date: str, end_date: str, skip_dates=None, unit: str = 'week') -> List[Tuple[str, str]]:
+    """
+    Split a date range into chunks aligned to calendar units, leaving out any dates in skip_dates.
+    Each chunk covers a run of consecutive missing dates within one calendar unit, so the same
+    dates map to the same chunks across overlapping requests and cached dates are never fetched again.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    skip_dates = skip_dates or set()
+    chunks = []
+
+    window_start = unit_start(start, unit)
+    while window_start <= end:
+        window_end = next_unit_start(window_start, unit) - timedelta(days=1)
+        # Only request the runs of the window that are in range and not cached yet
+        run_start = None
+        current = max(window_start, start)
+        last = min(window_end, end)
+        while current <= last:
+            date = current.strftime('%Y-%m-%d')
+            if date in skip_dates:
+                if run_start is not None:
+                    chunks.append((run_start, (current - timedelta(days=1)).strftime('%Y-%m-%d')))
+                    run_start = None
+            elif run_start is None:
+                run_start = date
+            current += timedelta(days=1)
+        if run_start is not None:
+            chunks.append((run_start, last.strftime('%Y-%m-%d')))
+        window_start = window_end + timedelta(days=1)
+
+    return chunks
+
+
+def is_chunk_error(error: BaseException) -> bool:
+    """Whether a failed request might succeed with a smaller date range"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in SPLIT_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ServerTimeoutError))
+
+
+class ChunkPlanner:
+    """
+    Learns the largest calendar unit an endpoint handles. Chunks start at the learned unit;
+    a chunk that is rejected as too large, times out or looks truncated is split once into the
+    next smaller unit, and repeated failures make the endpoint start smaller. After a long run of successes it tries larger again.
+    """
+
+    def __init__(self, name: str, unit: str = MAX_CHUNK_UNIT):
+        self.name = name
+        self.max_unit = unit
+        self.unit = unit
+        self._failures: Dict[str, int] = {}
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, unit: str):
+        with self._lock:
+            if unit != self.unit:
+                return
+            self._successes += 1
+            larger = larger_unit(self.unit)
+            if (self._successes >= GROW_AFTER_SUCCESSES and larger is not None
+                    and CHUNK_UNITS.index(larger) >= CHUNK_UNITS.index(self.max_unit)):
+                logger.info(f"Trying {larger} chunks again on {self.name}")
+                self.unit = larger
+                self._successes = 0
+                self._failures[larger] = SHRINK_AFTER_FAILURES - 1  # One more failure shrinks it again
+
+    def record_failure(self, unit: str):
+        with self._lock:
+            self._failures[unit] = self._failures.get(unit, 0) + 1
+            smaller = smaller_unit(unit)
+            if (unit == self.unit and smaller is not None
+                    and self._failures[unit] >= SHRINK_AFTER_FAILURES):
+                logger.warning(f"Chunks of one {unit} keep failing on {self.name}; using {smaller} chunks")
+                self.unit = smaller
+                self._successes = 0
+
+    def split(self, start_date: str, end_date: str, skip_dates=None) -> List[Tuple[str, str]]:
+        """Chunks of the currently learned unit"""
+        return split_date_range(start_date, end_date, skip_dates, self.unit)
+
+    async def fetch(self, fetch: Callable[[str, str], Awaitable[List[Dict[str, Any]]]],
+                    chunk_start: str, chunk_end: str, unit: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch a chunk with fetch(start, end), splitting it once into the next smaller calendar
+        unit if the upstream rejects it as too large (see is_chunk_error) or returns a response
+        that may be truncated. Any other error, including a 5xx after its retries, is raised.
+        """
+        unit = unit or self.unit
+        smaller = smaller_unit(unit)
+        try:
+            result = await fetch(chunk_start, chunk_end)
+        except Exception as e:
+            if smaller is None or chunk_start == chunk_end or not is_chunk_error(e):
+                raise
+            logger.warning(f"{self.name} failed on {chunk_start} to {chunk_end}; splitting into {smaller} chunks: {str(e)}")
+            self.record_failure(unit)
+        else:
+            if smaller is None or chunk_start == chunk_end or len(result) < MAX_RESPONSE_DAYS:
+                self.record_success(unit)
+                return result
+            logger.warning(f"{self.name} returned {len(result)} days for {chunk_start} to {chunk_end}; splitting into {smaller} chunks")
+            self.record_failure(unit)
+
+        # The parts are not split again, so one bad chunk costs at most one extra round of requests
+        parts = split_date_range(chunk_start, chunk_end, unit=smaller)
+        results = await asyncio.gather(
+            *(fetch(part_start, part_end) for part_start, part_end in parts),
+            return_exceptions=True
+        )
+        merged = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            merged.extend(result)
+        return merged
+
+
+# Learned chunk units per endpoint, shared by every job in the process
+chunk_planners: Dict[str, ChunkPlanner] = {}
+_planners_lock = threading.Lock()
+
+
+def get_chunk_planner(name: str) -> ChunkPlanner:
+    """Get the chunk planner of an endpoint"""
+    with _planners_lock:
+        planner = chunk_planners.get(name)
+        if planner is None:
+            planner = chunk_planners[name] = ChunkPlanner(name)
+        return planner
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from analytics_cache import workspace_key
+
+logger = logging.getLogger(__name__)
+
+# Configuration for circuit breakers
+WINDOW_SECONDS = 30        # Recent requests considered for the error rate
+MIN_FAILURES = 10          # Failures within the window before a breaker can open
+FAILURE_RATE = 0.5         # Share of failed requests within the window that opens a breaker
+OPEN_SECONDS = 15          # First time an open breaker rejects requests; doubles while probes fail
+MAX_OPEN_SECONDS = 300     # Longest time an open breaker rejects requests
+AUTH_OPEN_SECONDS = 300    # Time requests of an API key the upstream rejected are short-circuited
+PROBE_TIMEOUT = 60         # Seconds after which an unanswered probe no longer blocks the next one
+PROBE_WAIT = 1             # Seconds a held-back request waits while a probe is out
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """
+    A request was not sent because its API key or host is failing. retry_in is the time until
+    the breaker may let it through; tripped is set if the upstream rejected the API key, in
+    which case waiting won't help.
+    """
+
+    def __init__(self, name: str, retry_in: float, tripped: bool = False):
+        super().__init__(f"Circuit open for {name}; retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+        self.tripped = tripped
+
+
+class CircuitBreaker:
+    """
+    Rejects requests to a failing API key or host instead of letting every task retry.
+
+    The breaker opens when at least MIN_FAILURES of the requests in the last WINDOW_SECONDS
+    failed, counting each failing resource once, and they make up FAILURE_RATE of them, or at
+    once when trip() is called (e.g. on a 401). While open, check() raises; afterwards one probe
+    request at a time is let through by claim(), and its outcome closes the breaker or opens it
+    again for twice as long. A probe that gets no answer is given back with release().
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._outcomes = deque()  # (time, failed, resource) of recent requests
+        self._open_until = 0.0
+        self._tripped = False     # Opened by trip() rather than by the error rate
+        self._open_seconds = OPEN_SECONDS
+        self._probe_until: Optional[float] = None  # Set while half-open and a probe is out
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._probe_until is not None or time.monotonic() < self._open_until
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker may let a request through"""
+        remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            return remaining
+        return PROBE_WAIT if self._probe_until is not None else 0.0
+
+    def _blocked(self, now: float) -> bool:
+        if now < self._open_until:
+            return True
+        return self._probe_until is not None and now < self._probe_until
+
+    def check(self):
+        """Raise CircuitOpenError if a request may not be sent now; claims nothing"""
+        if self._blocked(time.monotonic()):
+            raise CircuitOpenError(self.name, self.retry_in(), self._tripped)
+
+    def claim(self) -> bool:
+        """
+        Let a request through. Returns True if it is the probe of a half-open breaker, whose
+        outcome must be recorded or which must be released. Raises CircuitOpenError if the
+        breaker is open or another request holds the probe.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._blocked(now):
+                raise CircuitOpenError(self.name, self.retry_in(), self._tripped)
+            if self._open_until == 0.0:
+                return False
+            # Half-open: a single probe finds out whether the upstream has recovered
+            self._probe_until = now + PROBE_TIMEOUT
+            return True
+
+    def release(self):
+        """Give back a probe claimed by claim() whose request was not sent or got no answer"""
+        with self._lock:
+            if self._probe_until is not None and time.monotonic() >= self._open_until:
+                self._probe_until = None
+
+    def record(self, failed: bool, resource: Optional[str] = None):
+        """
+        Record the outcome of a request that was allowed. Failures of the same resource (e.g.
+        one campaign) count once, so a single broken resource can't open the breaker.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._open_until:
+                if now < self._open_until:
+                    return  # A request sent before the breaker opened
+                if failed:
+                    self._open(now, min(2 * self._open_seconds, MAX_OPEN_SECONDS))
+                else:
+                    logger.info(f"Circuit closed for {self.name}")
+                    self._open_until = 0.0
+                    self._tripped = False
+                    self._open_seconds = OPEN_SECONDS
+                    self._probe_until = None
+                    self._outcomes.clear()
+                return
+            self._outcomes.append((now, failed, resource))
+            while self._outcomes and self._outcomes[0][0] < now - WINDOW_SECONDS:
+                self._outcomes.popleft()
+            failures = len({resource if resource is not None else index
+                            for index, (_, outcome, resource) in enumerate(self._outcomes) if outcome})
+            successes = sum(1 for _, outcome, _ in self._outcomes if not outcome)
+            if failures >= MIN_FAILURES and failures >= FAILURE_RATE * (failures + successes):
+                self._open(now, OPEN_SECONDS)
+
+    def trip(self, seconds: float = AUTH_OPEN_SECONDS):
+        """Open the breaker right away, e.g. because the upstream rejected the API key"""
+        with self._lock:
+            self._open(time.monotonic(), seconds)
+            self._tripped = True
+
+    def _open(self, now: float, seconds: float):
+        logger.warning(f"Circuit open for {self.name} for {seconds:.0f}s")
+        self._open_until = now + seconds
+        self._open_seconds = seconds
+        self._tripped = False
+        self._probe_until = None
+        self._outcomes.clear()
+
+
+# Shared by every job in the process
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get the process-wide circuit breaker with the given name"""
+    with _breakers_lock:
+        breaker = circuit_breakers.get(name)
+        if breaker is None:
+            breaker = circuit_breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_key_breaker(api_key: str) -> CircuitBreaker:
+    """Circuit breaker of an API key, named without the raw key"""
+    return get_circuit_breaker(f"API key {workspace_key(api_key)}")
+
+
+def get_host_breaker(url: str) -> CircuitBreaker:
+    """Circuit breaker of the host a URL points to"""
+    return get_circuit_breaker(f"host {urlparse(url).netloc}")
+
+
+def open_circuits() -> List[str]:
+    """Names of the breakers that currently reject requests"""
+    with _breakers_lock:
+        return [name for name, breaker in circuit_breakers.items() if breaker.is_open]
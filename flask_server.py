@@ -1,19 +1,33 @@
-from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
-import uuid
+from flask import Flask, Response, request, jsonify
+from datetime import datetime
 import asyncio
-import aiohttp
-import random
+import time
+import uuid
 import logging
 import os
-from instantly_campaign_api import InstantlyCampaignAPI
-from instantly_campaign_analytics_api import InstantlyCampaignAnalyticsAPI
-from typing import List, Dict, Any, Tuple
+import atexit
+from analytics_pipeline import (process_workspaces, encode_stream_record, result_events, campaign_filters,
+                                run_until_deadline, restore_workspace, workspace_events, CampaignFilter,
+                                RecordBuilder, blocking_executor, FILTER_FIELDS, GRANULARITIES, DEFAULT_GRANULARITY,
+                                STOPPED_ERROR)
+from job_checkpoint import JobCheckpoint
+from job_store import create_job_store
+from job_views import JobView, StatusCache, StatusQuery, serialize
+from job_progress import JobProgress
+from job_queue import JobQueue, QueueFull
+from rate_limiter import rate_limiters
+from circuit_breaker import open_circuits
+from async_runtime import AsyncRuntime
+from typing import List, Dict, Optional, Tuple
 import threading
-from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
+# Background event loop and pooled HTTP session shared by every job of this app
+async_runtime = AsyncRuntime()
+app.extensions['async_runtime'] = async_runtime
+atexit.register(async_runtime.stop)
+
 # Configure logging
 if not os.path.exists('logs'):
     os.makedirs('logs')
@@ -27,59 +41,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Configuration for concurrent requests
-MAX_CONCURRENT_REQUESTS = 10  # Maximum number of concurrent requests
-MAX_RETRIES = 5              # Maximum number of retries for failed requests
-BASE_DELAY = 1              # Base delay for exponential backoff (seconds)
-MAX_DELAY = 32             # Maximum delay for exponential backoff (seconds)
+# Store for job status and results; finished results are evicted by age and size
+job_store = create_job_store()
 
-async def fetch_with_retry(session: aiohttp.ClientSession, url: str, headers: Dict, params: Dict) -> Dict:
-    """Fetch data with exponential backoff retry logic"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            logger.debug(f"Making request to {url} (attempt {attempt + 1}/{MAX_RETRIES})")
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 429:  # Too Many Requests
-                    delay = min(BASE_DELAY * (2 ** attempt) + random.uniform(0, 1), MAX_DELAY)
-                    logger.warning(f"Rate limited on {url}. Retrying in {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
-                    await asyncio.sleep(delay)
-                    continue
-                    
-                response.raise_for_status()
-                logger.debug(f"Successfully fetched data from {url}")
-                return await response.json()
-                
-        except aiohttp.ClientError as e:
-            if attempt == MAX_RETRIES - 1:
-                logger.error(f"Failed to fetch data from {url} after {MAX_RETRIES} attempts: {str(e)}")
-                raise
-            delay = min(BASE_DELAY * (2 ** attempt) + random.uniform(0, 1), MAX_DELAY)
-            logger.warning(f"Request to {url} failed. Retrying in {delay:.2f} seconds... (attempt {attempt + 1}/{MAX_RETRIES})")
-            await asyncio.sleep(delay)
-            
-    error_msg = f"Max retries ({MAX_RETRIES}) exceeded for {url}"
-    logger.error(error_msg)
-    raise Exception(error_msg)
+# Requests and finished workspaces of unfinished jobs, resumed after a restart
+job_checkpoint = JobCheckpoint()
 
-# Store for job status and results
-job_store = {}
+# Sorted views and serialized status responses of completed jobs
+status_cache = StatusCache()
+# Cached views and responses of a job go when the job store lets go of it
+job_store.subscribe(status_cache.invalidate)
 
-def split_date_range(start_date: str, end_date: str) -> List[Tuple[str, str]]:
-    """Split date range into 7-day chunks"""
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    chunks = []
-    
-    current = start
-    while current < end:
-        chunk_end = min(current + timedelta(days=6), end)
-        chunks.append((
-            current.strftime('%Y-%m-%d'),
-            chunk_end.strftime('%Y-%m-%d')
-        ))
-        current = chunk_end + timedelta(days=1)
-    
-    return chunks
+# Condition per running job, notified whenever the job emits an event or finishes
+job_conditions = {}
+
+# Task-level progress and request statistics per running job
+job_progress = {}
+
+# Bounded queue and worker pool that runs the jobs, fairly across tenants
+job_queue = JobQueue()
+atexit.register(job_queue.stop)
+
+# asyncio task of each running job, cancelled by DELETE /analytics/bulk/<run_id>
+job_tasks = {}
+
+# Statuses of jobs that have not finished yet, and of finished jobs that have results
+ACTIVE_STATUSES = ('queued', 'processing')
+RESULT_STATUSES = ('completed', 'cancelled')
+
+# Configuration for streaming results
+STREAM_HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive lines while no event arrives
+MAX_STATUS_WAIT = 60            # Longest time a status request may block with ?wait=
 
 def validate_request(data: Dict) -> Tuple[bool, str]:
     """Validate the request data"""
@@ -101,176 +93,196 @@ def validate_request(data: Dict) -> Tuple[bool, str]:
     except ValueError:
         return False, "Invalid date format. Use YYYY-MM-DD"
     
+    if data.get('granularity', DEFAULT_GRANULARITY) not in GRANULARITIES:
+        return False, f"granularity must be one of: {', '.join(GRANULARITIES)}"
+    
+    try:
+        campaign_filters(data['api_keys'], data)
+    except ValueError as e:
+        return False, str(e)
+    
+    deadline = data.get('deadline')
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0):
+        return False, "deadline must be a positive number of seconds"
+    
     return True, ""
 
-async def fetch_campaign_analytics(session: aiohttp.ClientSession, api_key: str, 
-                                campaign_id: str, chunk_start: str, chunk_end: str) -> Dict:
-    """Fetch analytics for a single campaign in a date range"""
-    url = InstantlyCampaignAnalyticsAPI.BASE_URL
-    headers = {"Authorization": f"Bearer {api_key}"}
-    params = {
-        "campaign_id": campaign_id,
-        "start_date": chunk_start,
-        "end_date": chunk_end
-    }
+def new_job(run_id: str, status: str = 'processing') -> Dict:
+    """Create the job store entry, event condition and progress tracker for a new job"""
+    job_conditions[run_id] = threading.Condition()
+    job_progress[run_id] = JobProgress()
+    return job_store.create(run_id, {
+        'data': {},
+        'daily_totals': {},  # Combined daily totals across all workspaces
+        'total_sends': 0,    # Total sends across all workspaces
+        'status': status,
+        'error': None,
+        'completion': 0,
+        'version': 0,        # Bumped whenever completion or status changes
+        'changes': [],       # Workspace records of a running job, tagged with the version they caused
+        'events': []         # Events streamed to clients while the job runs; campaign events are only references
+    })
+
+def discard_job(run_id: str):
+    """Forget a job that was never started"""
+    job_checkpoint.delete_job(run_id)
+    job_store.delete(run_id)
+    job_conditions.pop(run_id, None)
+    job_progress.pop(run_id, None)
+
+def notify_job(run_id: str):
+    """Wake up clients waiting for new events or a status change of a job"""
+    condition = job_conditions.get(run_id)
+    if condition is not None:
+        with condition:
+            condition.notify_all()
+
+def finish_job(run_id: str, results: Dict):
+    """Store a job that will no longer change and wake up everyone waiting for it"""
+    # Finished results no longer need their event log; streams rebuild it from the data
+    results.pop('events', None)
+    results.pop('changes', None)
+    results['version'] = results.get('version', 0) + 1
+    progress = job_progress.pop(run_id, None)
+    if progress is not None:
+        # Keep the final counts and rates with the finished result
+        results['progress'] = progress.snapshot()
+    job_store.finish(run_id)
+    # The result is stored now, so the job no longer needs to be resumed
+    job_checkpoint.delete_job(run_id)
+    notify_job(run_id)
+    job_conditions.pop(run_id, None)
+
+def job_request(data: Dict) -> Dict:
+    """The parts of a start request needed to run the job, as saved in its checkpoint"""
+    fields = ('api_keys', 'start_date', 'end_date', 'workspace_filters') + FILTER_FIELDS
+    job = {field: data.get(field) for field in fields}
+    job['granularity'] = data.get('granularity', DEFAULT_GRANULARITY)
+    # The deadline counts from submission, so time spent in the queue is included
+    job['deadline_at'] = time.time() + data['deadline'] if data.get('deadline') is not None else None
+    return job
+
+def enqueue_job(run_id: str, tenant: str, job: Dict, submitted_at: float, admit_all: bool = False):
+    """Queue a job built by job_request() for the worker pool, raising QueueFull if it is not admitted"""
+    job_queue.submit(run_id, tenant, process_analytics_job,
+                     run_id, job['api_keys'], job['start_date'], job['end_date'], job['granularity'],
+                     campaign_filters(job['api_keys'], job), job['deadline_at'], submitted_at,
+                     admit_all=admit_all)
+
+async def run_job(run_id: str, api_keys: List[str], start_date: str, end_date: str, results: Dict,
+                  granularity: str = DEFAULT_GRANULARITY, filters: Optional[Dict[str, CampaignFilter]] = None,
+                  deadline_at: Optional[float] = None, submitted_at: Optional[float] = None):
+    """
+    Process all workspaces of a job with the app's shared HTTP session.
+    If the job is cancelled or reaches deadline_at (epoch seconds), it stops with the results
+    aggregated so far and results['stop_reason'] says why. Days cached since submitted_at are
+    not fetched again, and each finished workspace is checkpointed.
+    """
+    condition = job_conditions[run_id]
+    loop = asyncio.get_running_loop()
+    checkpoint_writes = []
+    
+    def on_event(record: Dict):
+        with condition:
+            results['events'].append(record)
+            if record['type'] == 'workspace':
+                # A finished workspace moves completion; long-polling clients get its summary
+                results['version'] += 1
+                change = {key: value for key, value in record.items() if key != 'type'}
+                results['changes'].append({"version": results['version'], **change})
+            condition.notify_all()
+        if record['type'] == 'workspace' and record['error'] != STOPPED_ERROR:
+            # Serializing a large workspace takes a while, so it is written off the loop
+            checkpoint_writes.append(loop.run_in_executor(
+                blocking_executor, job_checkpoint.save_workspace,
+                run_id, record['workspace'], results['data'][record['workspace']]
+            ))
+    
+    def on_progress():
+        # Completion moved by at least a percent; wake up long-polling clients
+        with condition:
+            results['version'] += 1
+            condition.notify_all()
     
-    return await fetch_with_retry(session, url, headers, params)
+    progress = job_progress.setdefault(run_id, JobProgress())
+    progress.subscribe(on_progress)
+    session = await async_runtime.get_session()
+    if results.get('stop_reason'):
+        # Cancelled while it was starting
+        return
+    job_tasks[run_id] = asyncio.current_task()
+    deadline = deadline_at - time.time() if deadline_at is not None else None
+    try:
+        stop_reason = await run_until_deadline(
+            process_workspaces(session, api_keys, start_date, end_date, results, on_event, progress, granularity,
+                               filters, submitted_at),
+            deadline
+        )
+    except asyncio.CancelledError:
+        stop_reason = 'cancelled'
+    finally:
+        job_tasks.pop(run_id, None)
+        # The checkpoint is deleted once the job finishes, so no write may land after that
+        for write in asyncio.as_completed(checkpoint_writes):
+            try:
+                await write
+            except Exception as e:
+                logger.warning(f"Failed to checkpoint a workspace of job {run_id}: {str(e)}")
+    if stop_reason is not None:
+        logger.info(f"Stopped job {run_id} ({stop_reason}) with the results aggregated so far")
+        results['stop_reason'] = stop_reason
 
-async def process_campaign_batch(api_key: str, campaign_ids: List[str], 
-                               date_chunks: List[Tuple[str, str]]) -> Dict:
-    """Process a batch of campaigns concurrently"""
-    logger.info(f"Starting batch processing for {len(campaign_ids)} campaigns with {len(date_chunks)} date chunks")
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for campaign_id in campaign_ids:
-            for chunk_start, chunk_end in date_chunks:
-                task = fetch_campaign_analytics(
-                    session, api_key, campaign_id, chunk_start, chunk_end
-                )
-                tasks.append(task)
-        
-        total_tasks = len(tasks)
-        logger.info(f"Created {total_tasks} tasks for processing")
-                
-        # Process tasks in batches to avoid overwhelming the API
-        analytics_results = []
-        batch_count = (total_tasks + MAX_CONCURRENT_REQUESTS - 1) // MAX_CONCURRENT_REQUESTS
-        for i in range(0, len(tasks), MAX_CONCURRENT_REQUESTS):
-            batch = tasks[i:i + MAX_CONCURRENT_REQUESTS]
-            current_batch = (i // MAX_CONCURRENT_REQUESTS) + 1
-            logger.info(f"Processing batch {current_batch}/{batch_count} ({len(batch)} tasks)")
-            
-            batch_results = await asyncio.gather(*batch, return_exceptions=True)
-            success_count = sum(1 for r in batch_results if not isinstance(r, Exception))
-            error_count = len(batch_results) - success_count
-            logger.info(f"Batch {current_batch} completed: {success_count} successful, {error_count} failed")
-            
-            analytics_results.extend(batch_results)
-            
-        logger.info(f"Batch processing completed. Total tasks processed: {total_tasks}")
-        return analytics_results
+async def cancel_job_task(run_id: str):
+    """Cancel the task of a running job; runs on the runtime loop"""
+    task = job_tasks.get(run_id)
+    if task is not None:
+        task.cancel()
 
-def process_analytics_job(run_id: str, api_keys: List[str], start_date: str, end_date: str):
+def process_analytics_job(run_id: str, api_keys: List[str], start_date: str, end_date: str,
+                          granularity: str = DEFAULT_GRANULARITY,
+                          filters: Optional[Dict[str, CampaignFilter]] = None,
+                          deadline_at: Optional[float] = None, submitted_at: Optional[float] = None):
     """Background task to process analytics"""
     logger.info(f"Starting analytics job {run_id} for date range {start_date} to {end_date}")
     try:
-        results = {
-            'data': {},
-            'daily_totals': {},  # Combined daily totals across all workspaces
-            'total_sends': 0,    # Total sends across all workspaces
-            'status': 'processing',
-            'error': None,
-            'completion': 0
-        }
-        job_store[run_id] = results
+        results = job_store.get(run_id) or new_job(run_id)
         logger.debug(f"Initialized job store for run_id: {run_id}")
+        if results['status'] == 'queued':
+            results['status'] = 'processing'
+            results['version'] += 1
+            notify_job(run_id)
         
-        total_items = len(api_keys)
-        processed_items = 0
+        # Duplicate keys would fetch the same workspace twice into the same result slot
+        api_keys = list(dict.fromkeys(api_keys))
         
-        for api_key in api_keys:
-            try:
-                workspace_data = {
-                    "campaign_analytics": {},
-                    "total_sent": 0,
-                    "error": None
-                }
-                
-                # Get all campaign IDs for this workspace
-                campaign_api = InstantlyCampaignAPI(api_key)
-                analytics_api = InstantlyCampaignAnalyticsAPI(api_key)
-                
-                try:
-                    logger.info(f"Fetching campaign IDs for workspace (API key ending: ...{api_key[-4:]})")
-                    campaign_ids = campaign_api.get_campaign_ids()
-                    logger.info(f"Found {len(campaign_ids)} campaigns for workspace (API key ending: ...{api_key[-4:]})")
-                except Exception as e:
-                    error_msg = f"Failed to fetch campaign IDs: {str(e)}"
-                    logger.error(f"Workspace (API key ending: ...{api_key[-4:]}) - {error_msg}")
-                    workspace_data["error"] = error_msg
-                    results['data'][api_key] = workspace_data
-                    continue
-                
-                # Split date range into 7-day chunks
-                date_chunks = split_date_range(start_date, end_date)
-                print(f"Split date range into {len(date_chunks)} chunks")
-                
-                # Process campaigns in batches
-                date_chunks = split_date_range(start_date, end_date)
-                print(f"Split date range into {len(date_chunks)} chunks")
-                
-                # Create event loop in the thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Process campaigns concurrently
-                analytics_results = loop.run_until_complete(
-                    process_campaign_batch(api_key, campaign_ids, date_chunks)
-                )
-                
-                # Process results
-                campaign_analytics = {}
-                for campaign_id in campaign_ids:
-                    campaign_data = {
-                        "daily_sends": {},
-                        "total_sent": 0,
-                        "error": None
-                    }
-                    campaign_analytics[campaign_id] = campaign_data
-                
-                # Process the analytics results
-                for i, result in enumerate(analytics_results):
-                    if isinstance(result, Exception):
-                        print(f"Error in batch request {i}: {str(result)}")
-                        continue
-                        
-                    campaign_idx = i // len(date_chunks)
-                    campaign_id = campaign_ids[campaign_idx]
-                    campaign_data = campaign_analytics[campaign_id]
-                    
-                    try:
-                        # Process analytics data
-                        for day in result:
-                            date = day['date']
-                            sends = day['sent']
-                            
-                            # Update campaign daily sends
-                            if date not in campaign_data["daily_sends"]:
-                                campaign_data["daily_sends"][date] = 0
-                            campaign_data["daily_sends"][date] += sends
-                            campaign_data["total_sent"] += sends
-                            workspace_data["total_sent"] += sends
-                            
-                            # Update combined daily totals
-                            if date not in results['daily_totals']:
-                                results['daily_totals'][date] = 0
-                            results['daily_totals'][date] += sends
-                            results['total_sends'] += sends
-                            
-                    except Exception as e:
-                        print(f"Error processing result for campaign {campaign_id}: {str(e)}")
-                
-                workspace_data["campaign_analytics"] = campaign_analytics
-                results['data'][api_key] = workspace_data
-                
-            except Exception as e:
-                results['data'][api_key] = {
-                    "campaign_analytics": {},
-                    "total_sent": 0,
-                    "error": f"Workspace error: {str(e)}"
-                }
-            
-            processed_items += 1
-            results['completion'] = (processed_items / total_items) * 100
+        # Workspaces finished by an interrupted run of this job are not fetched again
+        restored = job_checkpoint.get_workspaces(run_id, api_keys)
+        for api_key, workspace_data in restored.items():
+            restore_workspace(results, api_key, workspace_data)
+            results['events'].extend(workspace_events(api_key, workspace_data))
+        if restored:
+            logger.info(f"Restored {len(restored)} finished workspaces of job {run_id} from its checkpoint")
+        api_keys = [api_key for api_key in api_keys if api_key not in restored]
+        
+        # Run every workspace of the job on the shared event loop and wait for it here
+        try:
+            async_runtime.run(run_job(run_id, api_keys, start_date, end_date, results, granularity, filters,
+                                      deadline_at, submitted_at))
+        finally:
+            # Keep the learned per-key request rates across restarts
+            rate_limiters.save()
             
-        results['status'] = 'completed'
-        results['completion'] = 100
+        stop_reason = results.get('stop_reason')
+        # A job stopped at its deadline completes with partial results
+        results['status'] = 'cancelled' if stop_reason == 'cancelled' else 'completed'
+        if stop_reason is None:
+            results['completion'] = 100
         
     except Exception as e:
         results['status'] = 'failed'
         results['error'] = str(e)
     finally:
-        job_store[run_id].update(results)
+        finish_job(run_id, results)
 
 @app.route('/analytics/bulk/start', methods=['POST'])
 def start_bulk_analytics():
@@ -291,19 +303,29 @@ def start_bulk_analytics():
             
         # Generate unique run ID
         run_id = str(uuid.uuid4())
+        new_job(run_id, status='queued')
         
-        # Start background processing
-        thread = threading.Thread(
-            target=process_analytics_job,
-            args=(run_id, data['api_keys'], data['start_date'], data['end_date'])
-        )
-        thread.daemon = True  # Daemon thread will be killed when main thread exits
-        thread.start()
+        # Queue the job for the worker pool; jobs are admitted per tenant
+        tenant = request.headers.get('X-Tenant-ID') or request.remote_addr or 'default'
+        job = job_request(data)
+        job_checkpoint.save_job(run_id, tenant, job)
+        try:
+            enqueue_job(run_id, tenant, job, time.time())
+        except QueueFull as e:
+            discard_job(run_id)
+            logger.warning(f"Rejected job for tenant {tenant}: {str(e)}")
+            response = jsonify({
+                "status": "error",
+                "message": str(e),
+                "retry_after": e.retry_after
+            })
+            return response, 429 if e.tenant_limit else 503, {'Retry-After': str(e.retry_after)}
         
         return jsonify({
             "status": "accepted",
             "run_id": run_id,
-            "message": "Job started successfully"
+            "message": "Job queued successfully",
+            "queue_position": job_queue.position(run_id)
         }), 202
         
     except Exception as e:
@@ -314,40 +336,215 @@ def start_bulk_analytics():
 
 @app.route('/analytics/bulk/status/<run_id>', methods=['GET'])
 def get_bulk_analytics_status(run_id):
-    """Get the status and results of a bulk analytics job"""
+    """
+    Get the status and results of a bulk analytics job.
+    Query parameters: fields=totals, workspace, campaign_id, limit, cursor and partial (see USAGE.md).
+    With since=<version>, only changes after that version are returned, and wait=<seconds>
+    blocks until there is one.
+    """
     logger.info(f"Checking status for job {run_id}")
-    if run_id not in job_store:
+    try:
+        query = StatusQuery.from_args(request.args)
+        since = request.args.get('since', type=int)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_STATUS_WAIT)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    
+    if since is not None:
+        changes = wait_for_changes(run_id, since, wait)
+        if changes is not None:
+            return changes
+    
+    # Completed jobs never change, so repeat polls are answered from the cache
+    body = status_cache.get_response(run_id, query)
+    if body is not None:
+        return Response(body, mimetype='application/json')
+    
+    view = status_cache.get_view(run_id)
+    if view is None:
+        job = job_store.get(run_id)
+        if job is None:
+            logger.warning(f"Job not found: {run_id}")
+            return jsonify({
+                "status": "error",
+                "message": "Job not found"
+            }), 404
+            
+        if job['status'] not in RESULT_STATUSES and query.partial:
+            # Results of a running job so far, folded in as each request completes
+            view = JobView(job, partial=True, progress=progress_snapshot(run_id, job))
+            return Response(serialize(view.build_response(query)), mimetype='application/json')
+            
+        if job['status'] not in RESULT_STATUSES:
+            response = {
+                "status": job['status'],
+                "completion": job['completion'],
+                "version": job.get('version', 0),
+                "progress": progress_snapshot(run_id, job)
+            }
+            if job['status'] == 'queued':
+                response['queue_position'] = job_queue.position(run_id)
+            if job['status'] == 'failed':
+                response['error'] = job['error']
+            return jsonify(response)
+            
+        view = status_cache.put_view(run_id, job)
+    
+    body = serialize(view.build_response(query))
+    status_cache.put_response(run_id, query, body)
+    return Response(body, mimetype='application/json')
+
+def progress_snapshot(run_id: str, job: Dict) -> Dict:
+    """Live progress of a running job, or the final progress stored with a finished one"""
+    progress = job_progress.get(run_id)
+    if progress is not None:
+        return progress.snapshot()
+    return job.get('progress')
+
+def wait_for_changes(run_id: str, since: int, wait: float):
+    """
+    Block until a job's version moves past since or wait seconds pass.
+    Returns the response for a running or unchanged job, or None if the full status
+    response should be sent because the job has finished since that version.
+    """
+    # A finished job only needs its version and status here, so its results are not loaded
+    job = job_store.get_running(run_id) or job_store.get_status(run_id)
+    if job is None:
+        return None
+    condition = job_conditions.get(run_id)
+    if condition is not None and wait > 0:
+        with condition:
+            condition.wait_for(lambda: job['version'] > since, wait)
+    
+    version = job.get('version', 0)
+    if version > since and job['status'] not in ACTIVE_STATUSES:
+        return None
+    response = {
+        "status": job['status'],
+        "completion": job['completion'],
+        "version": version,
+        "changed": version > since
+    }
+    if job['status'] == 'queued':
+        response['queue_position'] = job_queue.position(run_id)
+    if job['status'] in ACTIVE_STATUSES:
+        response['progress'] = progress_snapshot(run_id, job)
+        response['workspaces'] = [change for change in job['changes'] if change['version'] > since]
+    return jsonify(response)
+
+@app.route('/analytics/bulk/stream/<run_id>', methods=['GET'])
+def stream_bulk_analytics(run_id):
+    """Stream per-campaign, per-workspace and final totals records of a job as NDJSON or SSE"""
+    logger.info(f"Streaming results for job {run_id}")
+    job = job_store.get(run_id)
+    if job is None:
         logger.warning(f"Job not found: {run_id}")
         return jsonify({
             "status": "error",
             "message": "Job not found"
         }), 404
         
-    job = job_store[run_id]
-    response = {
-        "status": job['status'],
-        "completion": job['completion']
-    }
+    condition = job_conditions.get(run_id) or threading.Condition()
+    events = job.get('events')
+    if events is None:
+        # The job has finished and dropped its event log
+        events = list(result_events(job)) if job['status'] in RESULT_STATUSES else []
+    builder = RecordBuilder(job)
+    sse = request.args.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
     
-    # Include results if job is completed
-    if job['status'] == 'completed':
-        response.update({
-            'data': job['data'],
-            'daily_totals': dict(sorted(job['daily_totals'].items())),  # Sort by date
-            'total_sends': job['total_sends']
+    def generate():
+        index = 0
+        while True:
+            with condition:
+                if index >= len(events) and job['status'] in ACTIVE_STATUSES:
+                    condition.wait(STREAM_HEARTBEAT_INTERVAL)
+                records = events[index:]
+                finished = job['status'] not in ACTIVE_STATUSES
+            index += len(records)
+            
+            for event in records:
+                record = builder.record(event)
+                if record is not None:
+                    yield encode_stream_record(record, sse)
+                
+            if finished and index >= len(events):
+                if job['status'] == 'failed':
+                    yield encode_stream_record({"type": "error", "error": job['error']}, sse)
+                return
+            if not records:
+                # Keep proxies and clients from timing out the idle connection
+                yield ": keep-alive\n\n" if sse else "\n"
+    
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+
+@app.route('/analytics/bulk/<run_id>', methods=['DELETE'])
+def cancel_bulk_analytics(run_id):
+    """Cancel a queued or running job; a running job keeps the results aggregated so far"""
+    logger.info(f"Cancelling job {run_id}")
+    job = job_store.get(run_id)
+    if job is None:
+        logger.warning(f"Job not found: {run_id}")
+        return jsonify({
+            "status": "error",
+            "message": "Job not found"
+        }), 404
+        
+    if job['status'] not in ACTIVE_STATUSES:
+        return jsonify({
+            "status": "error",
+            "message": f"Job has already {job['status']}"
+        }), 409
+        
+    job['stop_reason'] = 'cancelled'
+    if job_queue.cancel(run_id):
+        # The job never started, so there is nothing to stop
+        job['status'] = 'cancelled'
+        finish_job(run_id, job)
+        return jsonify({
+            "status": "cancelled",
+            "run_id": run_id
         })
-    elif job['status'] == 'failed':
-        response['error'] = job['error']
         
-    return jsonify(response)
+    # In-flight requests are cancelled on the runtime loop and their rate limit tokens returned
+    async_runtime.submit(cancel_job_task(run_id))
+    return jsonify({
+        "status": "cancelling",
+        "run_id": run_id
+    }), 202
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "jobs": job_queue.stats(),
+        "open_circuits": open_circuits()
     })
 
+def resume_interrupted_jobs():
+    """
+    Queue the jobs a previous process left unfinished, under their original run IDs.
+    They skip the workspaces that had finished and the chunks already in the analytics cache.
+    """
+    for checkpoint in job_checkpoint.interrupted_jobs():
+        run_id = checkpoint['run_id']
+        existing = job_store.get(run_id)
+        if existing is not None:
+            # Finished (or already resumed) before its checkpoint was removed
+            if existing['status'] not in ACTIVE_STATUSES:
+                job_checkpoint.delete_job(run_id)
+            continue
+        logger.info(f"Resuming interrupted job {run_id}")
+        new_job(run_id, status='queued')
+        enqueue_job(run_id, checkpoint['tenant'], checkpoint['request'], checkpoint['created_at'], admit_all=True)
+
 if __name__ == '__main__':
+    # With the debug reloader, only the serving child process resumes jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_interrupted_jobs()
     app.run(host='0.0.0.0', port=5000, debug=True)
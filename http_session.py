@@ -0,0 +1,52 @@
+import threading
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configuration for the shared synchronous HTTP session
+POOL_CONNECTIONS = 10       # Number of hosts to keep connection pools for
+POOL_MAXSIZE = 20           # Maximum number of kept-alive connections per host
+MAX_RETRIES = 5             # Maximum number of retries for failed requests
+BACKOFF_FACTOR = 1          # Base delay for exponential backoff (seconds)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CONNECT_TIMEOUT = 10        # Seconds to wait for a connection (including TLS handshake)
+READ_TIMEOUT = 60           # Seconds to wait for data from an open connection
+DEFAULT_TIMEOUT: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def create_session(pool_maxsize: int = POOL_MAXSIZE, max_retries: int = MAX_RETRIES) -> requests.Session:
+    """
+    Create a requests.Session with a sized keep-alive connection pool and retry with backoff.
+    Args:
+        pool_maxsize: Maximum number of kept-alive connections per host.
+        max_retries: Maximum number of retries for connection errors and retryable statuses.
+    Returns:
+        Configured requests.Session.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_shared_session() -> requests.Session:
+    """Get the process-wide session used by the API clients unless one is injected"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
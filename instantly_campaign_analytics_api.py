@@ -1,20 +1,29 @@
 import requests
+import aiohttp
+from http_session import get_shared_session, DEFAULT_TIMEOUT
+from async_http import fetch_with_retry
+from circuit_breaker import CircuitBreaker, get_key_breaker
+from job_progress import JobProgress
+from rate_limiter import AdaptiveRateLimiter, get_rate_limiter
 from typing import Optional, Dict, Any
 
 class InstantlyCampaignAnalyticsAPI:
     BASE_URL = "https://api.instantly.ai/api/v2/campaigns/analytics/daily"
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None, timeout=DEFAULT_TIMEOUT):
         self.api_key = api_key
         self.headers = {
             "Authorization": f"Bearer {self.api_key}"
         }
+        # Pooled keep-alive session shared by all clients unless one is injected
+        self.session = session or get_shared_session()
+        self.timeout = timeout
 
-    def get_daily_campaign_analytics(self, campaign_id: str, start_date: str, end_date: str = None, campaign_status: Optional[int] = None) -> list:
+    def get_daily_campaign_analytics(self, campaign_id: Optional[str], start_date: str, end_date: str = None, campaign_status: Optional[int] = None) -> list:
         """
-        Fetch daily analytics for a given campaign between dates.
+        Fetch daily analytics for a given campaign, or the whole workspace, between dates.
         Args:
-            campaign_id: Campaign UUID.
+            campaign_id: Campaign UUID, or None for analytics aggregated across all campaigns of the workspace.
             start_date: Start date in YYYY-MM-DD format.
             end_date: End date in YYYY-MM-DD format (optional, defaults to start_date).
             campaign_status: Optional campaign status filter.
@@ -22,13 +31,57 @@ class InstantlyCampaignAnalyticsAPI:
             List of dictionaries with daily analytics data.
         """
         params = {
-            "campaign_id": campaign_id,
             "start_date": start_date,
             "end_date": end_date or start_date
         }
+        if campaign_id is not None:
+            params["campaign_id"] = campaign_id
         if campaign_status is not None:
             params["campaign_status"] = campaign_status
 
-        response = requests.get(self.BASE_URL, headers=self.headers, params=params)
+        response = self.session.get(self.BASE_URL, headers=self.headers, params=params, timeout=self.timeout)
         response.raise_for_status()
         return response.json()
+
+class AsyncInstantlyCampaignAnalyticsAPI:
+    BASE_URL = "https://api.instantly.ai/api/v2/campaigns/analytics/daily"
+
+    def __init__(self, api_key: str, session: aiohttp.ClientSession, limiter: Optional[AdaptiveRateLimiter] = None,
+                 progress: Optional[JobProgress] = None, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self.session = session
+        # Requests share the process-wide rate limit of this API key unless one is injected
+        self.limiter = limiter or get_rate_limiter(api_key)
+        # Optional job progress that counts every request, throttled response and retry
+        self.progress = progress
+        # Requests short-circuit while this API key is failing, in every job of the process
+        self.breaker = breaker or get_key_breaker(api_key)
+
+    async def get_daily_campaign_analytics(self, campaign_id: Optional[str], start_date: str, end_date: str = None, campaign_status: Optional[int] = None,
+                                           attempt: int = 0, defer_retries: bool = False) -> list:
+        """
+        Fetch daily analytics for a given campaign, or the whole workspace, between dates.
+        Args:
+            campaign_id: Campaign UUID, or None for analytics aggregated across all campaigns of the workspace.
+            start_date: Start date in YYYY-MM-DD format.
+            end_date: End date in YYYY-MM-DD format (optional, defaults to start_date).
+            campaign_status: Optional campaign status filter.
+            attempt: Attempt to resume at when a deferred retry is sent again.
+            defer_retries: Raise DeferredRetry instead of waiting to retry (see fetch_with_retry).
+        Returns:
+            List of dictionaries with daily analytics data.
+        """
+        params = {
+            "start_date": start_date,
+            "end_date": end_date or start_date
+        }
+        if campaign_id is not None:
+            params["campaign_id"] = campaign_id
+        if campaign_status is not None:
+            params["campaign_status"] = str(campaign_status)
+
+        return await fetch_with_retry(self.session, self.BASE_URL, self.headers, params, self.limiter,
+                                      self.progress, self.breaker, attempt, defer_retries)
@@ -1,14 +1,65 @@
 import requests
-from typing import List, Optional
+import aiohttp
+from datetime import datetime, timedelta
+from http_session import get_shared_session, DEFAULT_TIMEOUT
+from async_http import fetch_with_retry
+from circuit_breaker import CircuitBreaker, get_key_breaker
+from job_progress import JobProgress
+from rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+
+# Campaign fields kept from the listing
+CAMPAIGN_METADATA_FIELDS = ("id", "name", "status", "timestamp_created", "timestamp_updated")
+
+# Campaign statuses of the Instantly API that matter for planning
+DRAFT_STATUS = 0             # Never launched, so there are no sends to fetch
+STOPPED_STATUSES = {2, 3}    # Paused or completed; no sends after the last update
+ACTIVITY_MARGIN_DAYS = 1     # Days kept around the active range for time zone differences
+
+def campaign_metadata(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The metadata kept from a campaign of the listing"""
+    return {field: item[field] for field in CAMPAIGN_METADATA_FIELDS if field in item}
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Date of an ISO timestamp such as '2025-07-28T10:11:12.000Z', or None if it can't be parsed"""
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def active_date_range(metadata: Dict[str, Any], start_date: str, end_date: str) -> Optional[Tuple[str, str]]:
+    """
+    The part of start_date..end_date in which a campaign can have sent anything: from its
+    creation until its last update if it is paused or completed. Returns None if there is no
+    such part. Missing or unparseable metadata leaves the range as it is.
+    """
+    status = metadata.get("status")
+    if status == DRAFT_STATUS:
+        return None
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    margin = timedelta(days=ACTIVITY_MARGIN_DAYS)
+    created = parse_timestamp(metadata.get("timestamp_created"))
+    if created is not None:
+        start = max(start, created - margin)
+    updated = parse_timestamp(metadata.get("timestamp_updated"))
+    if status in STOPPED_STATUSES and updated is not None:
+        end = min(end, updated + margin)
+    if start > end:
+        return None
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
 
 class InstantlyCampaignAPI:
     BASE_URL = "https://api.instantly.ai/api/v2/campaigns"
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None, timeout=DEFAULT_TIMEOUT):
         self.api_key = api_key
         self.headers = {
             "Authorization": f"Bearer {self.api_key}"
         }
+        # Pooled keep-alive session shared by all clients unless one is injected
+        self.session = session or get_shared_session()
+        self.timeout = timeout
 
     def get_campaign_ids(self, limit: int = 100, search: Optional[str] = None, tag_ids: Optional[List[str]] = None) -> List[str]:
         """
@@ -20,22 +71,108 @@ class InstantlyCampaignAPI:
         Returns:
             List of campaign IDs.
         """
+        return [campaign["id"] for campaign in self.get_campaigns(limit, search, tag_ids)]
+
+    def get_campaigns(self, limit: int = 100, search: Optional[str] = None, tag_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch the metadata of all campaigns in the Instantly workspace.
+        Args:
+            limit: Number of items to return (max 100).
+            search: Search by campaign name.
+            tag_ids: List of tag IDs to filter campaigns.
+        Returns:
+            List of campaign metadata (id, name, status, timestamp_created, timestamp_updated).
+        """
         params = {"limit": limit}
         if search:
             params["search"] = search
         if tag_ids:
             params["tag_ids"] = ",".join(tag_ids)
-        campaign_ids = []
+        campaigns = []
         starting_after = None
         while True:
             if starting_after:
                 params["starting_after"] = starting_after
-            response = requests.get(self.BASE_URL, headers=self.headers, params=params)
+            response = self.session.get(self.BASE_URL, headers=self.headers, params=params, timeout=self.timeout)
             response.raise_for_status()
             data = response.json()
             items = data.get("items", [])
-            campaign_ids.extend([item["id"] for item in items if "id" in item])
+            campaigns.extend([campaign_metadata(item) for item in items if "id" in item])
+            starting_after = data.get("next_starting_after")
+            if not starting_after or not items:
+                break
+        return campaigns
+
+class AsyncInstantlyCampaignAPI:
+    BASE_URL = "https://api.instantly.ai/api/v2/campaigns"
+
+    def __init__(self, api_key: str, session: aiohttp.ClientSession, limiter: Optional[AdaptiveRateLimiter] = None,
+                 progress: Optional[JobProgress] = None, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self.session = session
+        # Requests share the process-wide rate limit of this API key unless one is injected
+        self.limiter = limiter or get_rate_limiter(api_key)
+        # Optional job progress that counts every request, throttled response and retry
+        self.progress = progress
+        # Requests short-circuit while this API key is failing, in every job of the process
+        self.breaker = breaker or get_key_breaker(api_key)
+
+    async def iter_campaign_pages(self, limit: int = 100, search: Optional[str] = None,
+                                  tag_ids: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Iterate over pages of campaigns in the Instantly workspace.
+        Args:
+            limit: Number of items per page (max 100).
+            search: Search by campaign name.
+            tag_ids: List of tag IDs to filter campaigns.
+        Yields:
+            List of campaign dictionaries for each page.
+        """
+        params = {"limit": str(limit)}
+        if search:
+            params["search"] = search
+        if tag_ids:
+            params["tag_ids"] = ",".join(tag_ids)
+        starting_after = None
+        while True:
+            if starting_after:
+                params["starting_after"] = starting_after
+            data = await fetch_with_retry(self.session, self.BASE_URL, self.headers, params, self.limiter,
+                                          self.progress, self.breaker)
+            items = data.get("items", [])
+            if items:
+                yield items
             starting_after = data.get("next_starting_after")
             if not starting_after or not items:
                 break
-        return campaign_ids
+
+    async def get_campaign_ids(self, limit: int = 100, search: Optional[str] = None, tag_ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Fetch all campaign IDs from Instantly workspace.
+        Args:
+            limit: Number of items to return per page (max 100).
+            search: Search by campaign name.
+            tag_ids: List of tag IDs to filter campaigns.
+        Returns:
+            List of campaign IDs.
+        """
+        return [campaign["id"] for campaign in await self.get_campaigns(limit, search, tag_ids)]
+
+    async def get_campaigns(self, limit: int = 100, search: Optional[str] = None,
+                            tag_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch the metadata of all campaigns in the Instantly workspace.
+        Args:
+            limit: Number of items to return per page (max 100).
+            search: Search by campaign name.
+            tag_ids: List of tag IDs to filter campaigns.
+        Returns:
+            List of campaign metadata (id, name, status, timestamp_created, timestamp_updated).
+        """
+        campaigns = []
+        async for items in self.iter_campaign_pages(limit, search, tag_ids):
+            campaigns.extend([campaign_metadata(item) for item in items if "id" in item])
+        return campaigns
@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+from analytics_cache import workspace_key
+from job_store import encode_result
+
+logger = logging.getLogger(__name__)
+
+# Configuration for job checkpoints
+JOB_CHECKPOINT_PATH = os.environ.get('JOB_CHECKPOINT_PATH', os.path.join('cache', 'job_checkpoints.db'))
+
+
+class JobCheckpoint:
+    """
+    Durable record of the jobs that have not finished yet, so they can be resumed after a restart.
+
+    A job's request is saved when it is submitted and each workspace's result as soon as the
+    workspace finishes; campaign x chunk results are already durable in the analytics cache.
+    Jobs are removed once they finish and their result is in the job store. Requests contain
+    the raw API keys, so the file is only readable by its owner.
+    """
+
+    def __init__(self, path: str = JOB_CHECKPOINT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        os.chmod(path, 0o600)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                run_id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                request TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workspaces (
+                run_id TEXT NOT NULL,
+                workspace TEXT NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (run_id, workspace)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def save_job(self, run_id: str, tenant: str, request: Dict[str, Any]):
+        """Record a submitted job; request holds everything needed to start it again"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                (run_id, tenant, json.dumps(request), time.time())
+            )
+            self._conn.commit()
+
+    def save_workspace(self, run_id: str, api_key: str, workspace_data: Dict[str, Any]):
+        """Record the result of a finished workspace"""
+        payload = json.dumps(workspace_data, default=encode_result)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workspaces VALUES (?, ?, ?)",
+                (run_id, workspace_key(api_key), payload)
+            )
+            self._conn.commit()
+
+    def get_workspaces(self, run_id: str, api_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Results of the finished workspaces of a job, by API key"""
+        keys = {workspace_key(api_key): api_key for api_key in api_keys}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workspace, result FROM workspaces WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {keys[workspace]: json.loads(result) for workspace, result in rows if workspace in keys}
+
+    def interrupted_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs that were submitted but never finished, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, tenant, request, created_at FROM jobs ORDER BY created_at"
+            ).fetchall()
+        return [
+            {"run_id": run_id, "tenant": tenant, "request": json.loads(request), "created_at": created_at}
+            for run_id, tenant, request, created_at in rows
+        ]
+
+    def delete_job(self, run_id: str):
+        """Forget a finished job"""
+        with self._lock:
+            self._conn.execute("DELETE FROM workspaces WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+            self._conn.commit()
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Configuration for progress reporting
+RATE_WINDOW = 30  # Seconds of recent activity used for rates and the ETA
+
+
+class JobProgress:
+    """
+    Progress of a job counted per campaign x date chunk task, with live request statistics.
+
+    Pipeline coroutines update it from the event loop; snapshot() may be called from any thread.
+    Callbacks registered with subscribe() are called whenever the whole-number completion
+    percentage moves.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[], None]] = []
+        self.started_at = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.retrying = 0
+        self.retries = 0
+        self.requests = 0
+        self.throttled = 0
+        self.completion = 0.0
+        self._workspaces: Dict[str, Dict[str, Any]] = {}
+        self._recent_tasks = deque()     # Finish times of tasks within RATE_WINDOW
+        self._recent_requests = deque()  # (time, throttled) of requests within RATE_WINDOW
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[], None]):
+        self._listeners.append(callback)
+
+    def add_workspace(self, api_key: str):
+        with self._lock:
+            self._workspaces[api_key] = {"planned": 0, "done": 0, "listed": False, "finished": False}
+
+    def tasks_planned(self, api_key: str, count: int):
+        with self._lock:
+            self._workspaces[api_key]["planned"] += count
+
+    def listing_done(self, api_key: str):
+        """All campaigns of a workspace are known, so its planned task count is final"""
+        with self._lock:
+            self._workspaces[api_key]["listed"] = True
+
+    def task_done(self, api_key: str, failed: bool = False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self._workspaces[api_key]["done"] += 1
+            self._recent_tasks.append(time.monotonic())
+        self._update_completion()
+
+    def workspace_done(self, api_key: str):
+        with self._lock:
+            workspace = self._workspaces[api_key]
+            # A workspace that stopped early has no tasks left, whatever was planned
+            workspace.update(planned=workspace["done"], listed=True, finished=True)
+        self._update_completion()
+
+    def record_request(self, status: Optional[int]):
+        """Count an upstream request; status is None if no response arrived"""
+        with self._lock:
+            self.requests += 1
+            if status == 429:
+                self.throttled += 1
+            self._recent_requests.append((time.monotonic(), status == 429))
+
+    def retry_started(self):
+        with self._lock:
+            self.retrying += 1
+            self.retries += 1
+
+    def retry_finished(self):
+        with self._lock:
+            self.retrying -= 1
+
+    @staticmethod
+    def _estimated_tasks(workspace: Dict[str, Any]) -> int:
+        # Campaigns are planned only slightly ahead of the requests, so until the listing is
+        # done, assume as much work is still unlisted as has been planned so far
+        return workspace["planned"] if workspace["listed"] else 2 * workspace["planned"]
+
+    def _update_completion(self):
+        with self._lock:
+            if not self._workspaces:
+                return
+            fractions = []
+            for workspace in self._workspaces.values():
+                if workspace["finished"]:
+                    fractions.append(1.0)
+                elif workspace["planned"]:
+                    fractions.append(workspace["done"] / self._estimated_tasks(workspace))
+                else:
+                    fractions.append(0.0)
+            # Estimates grow while campaigns are listed; never report going backwards,
+            # and leave 100% to the end of the job
+            completion = min(99.0, 100 * sum(fractions) / len(fractions))
+            previous = self.completion
+            self.completion = max(previous, round(completion, 1))
+            changed = int(self.completion) != int(previous)
+        if changed:
+            for callback in self._listeners:
+                callback()
+
+    def _trim(self, now: float):
+        while self._recent_tasks and self._recent_tasks[0] < now - RATE_WINDOW:
+            self._recent_tasks.popleft()
+        while self._recent_requests and self._recent_requests[0][0] < now - RATE_WINDOW:
+            self._recent_requests.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts, live rates and ETA as a JSON-serializable dict"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            window = min(RATE_WINDOW, max(now - self.started_at, 1e-6))
+            planned = sum(workspace["planned"] for workspace in self._workspaces.values())
+            planning = any(not workspace["listed"] for workspace in self._workspaces.values())
+            estimated = sum(self._estimated_tasks(workspace) for workspace in self._workspaces.values())
+            remaining = estimated - self.completed - self.failed
+            task_rate = len(self._recent_tasks) / window
+            recent_requests = len(self._recent_requests)
+            recent_throttled = sum(1 for _, throttled in self._recent_requests if throttled)
+            return {
+                "tasks_planned": planned,
+                "tasks_completed": self.completed,
+                "tasks_failed": self.failed,
+                "tasks_retrying": self.retrying,
+                "planning": planning,  # Campaigns are still being listed, so tasks_planned and the ETA are estimates
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "requests_per_second": round(recent_requests / window, 2),
+                "throttle_rate": round(recent_throttled / recent_requests, 3) if recent_requests else 0.0,
+                "eta_seconds": round(remaining / task_rate, 1) if task_rate > 0 else None,
+                "elapsed_seconds": round(now - self.started_at, 1)
+            }
@@ -0,0 +1,167 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration for the job queue
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))  # Jobs running at the same time
+MAX_QUEUED_JOBS = 100              # Jobs waiting across all tenants before new ones get 503
+MAX_QUEUED_JOBS_PER_TENANT = 10    # Jobs one tenant may have waiting before its new ones get 429
+MAX_RUNNING_JOBS_PER_TENANT = max(1, JOB_WORKERS // 2)  # Workers one tenant may occupy while others wait
+DEFAULT_JOB_SECONDS = 30           # Assumed job duration for Retry-After hints until one has finished
+DURATION_SMOOTHING = 0.2           # Weight of the latest job in the average job duration
+
+
+class QueueFull(Exception):
+    """A job was not admitted. retry_after is a hint in seconds; tenant_limit is set if only the tenant is over its limit"""
+
+    def __init__(self, message: str, retry_after: int, tenant_limit: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.tenant_limit = tenant_limit
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+
+    Waiting jobs are kept per tenant and workers take them round-robin across tenants,
+    skipping tenants that already occupy MAX_RUNNING_JOBS_PER_TENANT workers while another
+    tenant's job could start, so one tenant's backlog cannot starve the others. A tenant that
+    is alone uses every worker.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS,
+                 max_queued_per_tenant: int = MAX_QUEUED_JOBS_PER_TENANT,
+                 max_running_per_tenant: int = MAX_RUNNING_JOBS_PER_TENANT):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.max_running_per_tenant = max_running_per_tenant
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()  # Tenant -> waiting jobs, in serving order
+        self._running: Dict[str, int] = {}                        # Tenant -> jobs running
+        self._queued = 0
+        self._job_seconds = DEFAULT_JOB_SECONDS
+        self._threads = []
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def submit(self, run_id: str, tenant: str, target: Callable[..., Any], *args, admit_all: bool = False):
+        """
+        Queue target(*args) as job run_id of tenant, raising QueueFull if it is not admitted.
+        With admit_all, the queue limits are not applied (e.g. for jobs resumed after a restart).
+        """
+        with self._condition:
+            tenant_queue = self._queues.get(tenant)
+            if not admit_all and tenant_queue is not None and len(tenant_queue) >= self.max_queued_per_tenant:
+                raise QueueFull("Too many queued jobs for this tenant", self._retry_after(len(tenant_queue)), True)
+            if not admit_all and self._queued >= self.max_queued:
+                raise QueueFull("Job queue is full", self._retry_after(self._queued))
+            if tenant_queue is None:
+                tenant_queue = self._queues[tenant] = deque()
+            tenant_queue.append((run_id, target, args))
+            self._queued += 1
+            self._start_workers()
+            self._condition.notify()
+
+    def position(self, run_id: str) -> Optional[int]:
+        """Number of jobs that will start before a waiting job, or None if it is not waiting"""
+        with self._condition:
+            for position, (queued_id, _, _) in enumerate(self._serving_order()):
+                if queued_id == run_id:
+                    return position
+        return None
+
+    def cancel(self, run_id: str) -> bool:
+        """Remove a waiting job; returns False if it is not waiting (anymore)"""
+        with self._condition:
+            for tenant, tenant_queue in self._queues.items():
+                for job in tenant_queue:
+                    if job[0] == run_id:
+                        tenant_queue.remove(job)
+                        if not tenant_queue:
+                            del self._queues[tenant]
+                        self._queued -= 1
+                        return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "running": sum(self._running.values()),
+                "queued": self._queued,
+                "tenants": len(self._queues)
+            }
+
+    def stop(self):
+        """Let workers exit once no job is waiting"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _retry_after(self, waiting: int) -> int:
+        # Time until the waiting jobs have been worked off by the pool at the average job duration
+        return max(1, math.ceil((waiting + 1) * self._job_seconds / self.workers))
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _serving_order(self) -> Iterator[tuple]:
+        # Round-robin across tenants, starting with the tenant served least recently
+        queues = [list(tenant_queue) for tenant_queue in self._queues.values()]
+        for index in range(max((len(jobs) for jobs in queues), default=0)):
+            for jobs in queues:
+                if index < len(jobs):
+                    yield jobs[index]
+
+    def _next_job(self) -> Optional[tuple]:
+        tenant = next((tenant for tenant in self._queues
+                       if self._running.get(tenant, 0) < self.max_running_per_tenant), None)
+        if tenant is None:
+            # Every waiting tenant is at its limit, so no other tenant could use this worker
+            tenant = next(iter(self._queues), None)
+            if tenant is None:
+                return None
+        tenant_queue = self._queues[tenant]
+        job = tenant_queue.popleft()
+        if tenant_queue:
+            self._queues.move_to_end(tenant)
+        else:
+            del self._queues[tenant]
+        self._queued -= 1
+        self._running[tenant] = self._running.get(tenant, 0) + 1
+        return tenant, job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                entry = self._next_job()
+                while entry is None and not self._stopped:
+                    self._condition.wait()
+                    entry = self._next_job()
+                if entry is None:
+                    return
+            tenant, (run_id, target, args) = entry
+            started = time.monotonic()
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"Job {run_id} failed in the worker: {str(e)}")
+            finally:
+                with self._condition:
+                    self._running[tenant] -= 1
+                    if not self._running[tenant]:
+                        del self._running[tenant]
+                    duration = time.monotonic() - started
+                    self._job_seconds += DURATION_SMOOTHING * (duration - self._job_seconds)
+                    # A tenant at its running limit may have jobs that can start now
+                    self._condition.notify_all()
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Configuration for job result retention
+JOB_STORE_BACKEND = os.environ.get('JOB_STORE_BACKEND', 'sqlite')  # 'memory' or 'sqlite'
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join('cache', 'job_store.db'))
+JOB_TTL_SECONDS = 24 * 60 * 60           # Finished jobs are dropped this long after they finish
+MAX_MEMORY_RESULT_BYTES = 256 * 1024 ** 2  # Serialized size of finished results kept in memory
+MAX_DISK_RESULT_BYTES = 2 * 1024 ** 3      # Serialized size of finished results kept on disk
+STATUS_FIELDS = ('status', 'completion', 'version')  # Read by get_status() without loading the results
+
+
+def encode_result(value: Any) -> Any:
+    """JSON fallback for result objects such as SendMatrix that provide a compact to_json() form"""
+    if hasattr(value, 'to_json'):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JobStore(ABC):
+    """
+    Store for job status and results.
+
+    Running jobs are plain dicts kept in memory, because the pipeline updates them in
+    place. Once a job finishes, finish() hands it to the backend, which decides how
+    long it is kept (TTL) and evicts the least recently used results beyond a size budget.
+    Callbacks registered with subscribe() are called with the run ID of every job that is
+    deleted, expires or is evicted.
+    """
+
+    def __init__(self):
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.RLock()
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._listeners.append(callback)
+
+    def create(self, run_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Register a new running job"""
+        with self._lock:
+            self._running[run_id] = job
+        return job
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by run ID, or None if it is unknown or was evicted"""
+        with self._lock:
+            job = self._running.get(run_id)
+        if job is not None:
+            return job
+        return self._get_finished(run_id)
+
+    def get_running(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job that has not finished yet, or None"""
+        with self._lock:
+            return self._running.get(run_id)
+
+    def get_status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the status, completion and version of a job without loading the results of a
+        finished one or counting as an access for eviction. None if the job is unknown.
+        """
+        job = self.get_running(run_id)
+        if job is not None:
+            return {field: job.get(field) for field in STATUS_FIELDS}
+        return self._get_finished_status(run_id)
+
+    def __contains__(self, run_id: str) -> bool:
+        return self.get(run_id) is not None
+
+    def finish(self, run_id: str):
+        """Move a job that will no longer change to the finished results"""
+        with self._lock:
+            job = self._running.pop(run_id, None)
+            if job is None:
+                return
+            payload = json.dumps(job, default=encode_result)
+            self._store_finished(run_id, job, payload)
+        logger.debug(f"Stored finished job {run_id} ({len(payload)} bytes)")
+
+    def delete(self, run_id: str):
+        """Forget a job"""
+        with self._lock:
+            self._running.pop(run_id, None)
+            self._delete_finished(run_id)
+        self._removed(run_id)
+
+    def _removed(self, run_id: str):
+        for callback in self._listeners:
+            callback(run_id)
+
+    @abstractmethod
+    def _get_finished(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get a finished job, or None if it is unknown or has expired"""
+
+    @abstractmethod
+    def _get_finished_status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get the STATUS_FIELDS of a finished job, or None if it is unknown or has expired"""
+
+    @abstractmethod
+    def _store_finished(self, run_id: str, job: Dict[str, Any], payload: str):
+        """Keep a finished job; payload is its JSON form"""
+
+    @abstractmethod
+    def _delete_finished(self, run_id: str):
+        """Forget a finished job if it is kept"""
+
+
+class MemoryJobStore(JobStore):
+    """Keeps finished results on the Python heap with TTL and LRU eviction by result size"""
+
+    def __init__(self, ttl: float = JOB_TTL_SECONDS, max_bytes: int = MAX_MEMORY_RESULT_BYTES):
+        super().__init__()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._finished: "OrderedDict[str, tuple]" = OrderedDict()  # run_id -> (job, size, finished_at)
+        self._bytes = 0
+
+    def _get_finished(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict()
+            entry = self._finished.get(run_id)
+            if entry is None:
+                return None
+            self._finished.move_to_end(run_id)
+            return entry[0]
+
+    def _get_finished_status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict()
+            entry = self._finished.get(run_id)
+            if entry is None:
+                return None
+            return {field: entry[0].get(field) for field in STATUS_FIELDS}
+
+    def _store_finished(self, run_id: str, job: Dict[str, Any], payload: str):
+        self._delete_finished(run_id)
+        self._finished[run_id] = (job, len(payload), time.time())
+        self._bytes += len(payload)
+        self._evict()
+
+    def _delete_finished(self, run_id: str):
+        entry = self._finished.pop(run_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self):
+        expired_before = time.time() - self.ttl
+        for run_id in [run_id for run_id, (_, _, finished_at) in self._finished.items() if finished_at < expired_before]:
+            self._delete_finished(run_id)
+            self._removed(run_id)
+        # Least recently used results go first; the newest result is always kept
+        while self._bytes > self.max_bytes and len(self._finished) > 1:
+            run_id, (_, size, _) = self._finished.popitem(last=False)
+            self._bytes -= size
+            logger.info(f"Evicted job {run_id} from memory ({size} bytes)")
+            self._removed(run_id)
+
+
+class SQLiteJobStore(JobStore):
+    """Keeps finished results as JSON in SQLite, outside the Python heap, with TTL and LRU eviction"""
+
+    def __init__(self, path: str = JOB_STORE_PATH, ttl: float = JOB_TTL_SECONDS,
+                 max_bytes: int = MAX_DISK_RESULT_BYTES):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                run_id TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                finished_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                summary TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'summary' not in columns:
+            # Stores created before the summary column existed; fill it from the stored results
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+            fields = ", ".join(f"'{field}', json_extract(result, '$.{field}')" for field in STATUS_FIELDS)
+            self._conn.execute(f"UPDATE jobs SET summary = json_object({fields})")
+        self._conn.commit()
+        with self._lock:
+            self._evict()
+
+    def _get_finished(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, finished_at FROM jobs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time() - self.ttl:
+                self._delete_finished(run_id)
+                self._removed(run_id)
+                return None
+            self._conn.execute("UPDATE jobs SET accessed_at = ? WHERE run_id = ?", (time.time(), run_id))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _get_finished_status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM jobs WHERE run_id = ? AND finished_at >= ?", (run_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def _store_finished(self, run_id: str, job: Dict[str, Any], payload: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, payload, len(payload), now, now, json.dumps({field: job.get(field) for field in STATUS_FIELDS}))
+        )
+        self._conn.commit()
+        self._evict()
+
+    def _delete_finished(self, run_id: str):
+        self._conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+        self._conn.commit()
+
+    def _evict(self):
+        expired_before = time.time() - self.ttl
+        expired = self._conn.execute("SELECT run_id FROM jobs WHERE finished_at < ?", (expired_before,)).fetchall()
+        self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (expired_before,))
+        for (run_id,) in expired:
+            self._removed(run_id)
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM jobs").fetchone()[0]
+        if total > self.max_bytes:
+            # Least recently used results go first; the newest result is always kept
+            rows = self._conn.execute("SELECT run_id, size FROM jobs ORDER BY accessed_at").fetchall()
+            for run_id, size in rows[:-1]:
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+                total -= size
+                logger.info(f"Evicted job {run_id} from disk ({size} bytes)")
+                self._removed(run_id)
+        self._conn.commit()
+
+
+def create_job_store(backend: str = JOB_STORE_BACKEND) -> JobStore:
+    """Create the job store configured by JOB_STORE_BACKEND"""
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'sqlite':
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,234 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from analytics_pipeline import workspace_result
+from send_matrix import workspace_matrix
+
+# Configuration for status responses of completed jobs
+VIEW_CACHE_SIZE = 8                       # Completed jobs whose sorted view is kept in memory
+RESPONSE_CACHE_BYTES = 64 * 1024 ** 2     # Serialized status responses kept in memory
+RESPONSE_CACHE_TTL = 10 * 60              # Seconds a serialized status response is reused
+MAX_PAGE_SIZE = 1000                      # Largest number of campaigns returned per page
+
+
+class StatusQuery:
+    """Parsed query parameters of the status endpoint"""
+
+    def __init__(self, fields: str = 'all', workspaces: Optional[List[str]] = None,
+                 campaign_ids: Optional[List[str]] = None, cursor: Optional[str] = None,
+                 limit: Optional[int] = None, partial: bool = False):
+        self.fields = fields
+        self.partial = partial
+        self.workspaces = workspaces
+        self.campaign_ids = campaign_ids
+        self.cursor = cursor
+        self.limit = limit
+
+    @classmethod
+    def from_args(cls, args) -> "StatusQuery":
+        """Build a query from request args, raising ValueError for invalid values"""
+        fields = args.get('fields', 'all')
+        if fields not in ('all', 'totals'):
+            raise ValueError("fields must be 'all' or 'totals'")
+
+        limit = args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ValueError("limit must be an integer")
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+        cursor = args.get('cursor')
+        if cursor is not None:
+            decode_cursor(cursor)
+
+        workspaces = args.getlist('workspace') or None
+        campaign_ids = [c for value in args.getlist('campaign_id') for c in value.split(',') if c] or None
+        partial = args.get('partial', 'false').lower() in ('1', 'true', 'yes')
+        return cls(fields, workspaces, campaign_ids, cursor, limit, partial)
+
+    def cache_key(self) -> Tuple:
+        return (
+            self.fields,
+            tuple(self.workspaces or ()),
+            tuple(self.campaign_ids or ()),
+            self.cursor,
+            self.limit
+        )
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+class JobView:
+    """
+    Sorted, flattened form of a job. Views of completed jobs are built once and reused for
+    every query; a partial view of a running job is a snapshot of the results so far, reported
+    with progress, the job's live progress at that moment.
+    """
+
+    def __init__(self, job: Dict[str, Any], partial: bool = False, progress: Optional[Dict[str, Any]] = None):
+        self.job = job
+        self.progress = progress if progress is not None else job.get('progress')
+        self.matrices = {}
+        self.workspaces = {}  # API key -> (workspace data, total sent)
+        for api_key, workspace_data in list(job['data'].items()):
+            matrix = workspace_matrix(workspace_data)
+            self.matrices[api_key] = matrix
+            total_sent = workspace_data['total_sent']
+            if partial and 'daily_sends' not in workspace_data:
+                total_sent = matrix.total()
+            self.workspaces[api_key] = (workspace_data, total_sent)
+        if partial:
+            # Combined totals of a running job only cover finished workspaces; add up the matrices instead
+            daily_totals = {}
+            for api_key, (workspace_data, _) in self.workspaces.items():
+                workspace_daily = workspace_data.get('daily_sends') or self.matrices[api_key].daily_totals()
+                for date, sends in workspace_daily.items():
+                    daily_totals[date] = daily_totals.get(date, 0) + sends
+            self.total_sends = sum(total_sent for _, total_sent in self.workspaces.values())
+        else:
+            daily_totals = job['daily_totals']
+            self.total_sends = job['total_sends']
+        self.daily_totals = dict(sorted(daily_totals.items()))
+        # Campaigns in a stable order for cursor pagination
+        self.campaigns = [
+            (api_key, campaign_id)
+            for api_key, matrix in self.matrices.items()
+            for campaign_id in list(matrix.campaign_ids)
+        ]
+
+    def build_response(self, query: StatusQuery) -> Dict[str, Any]:
+        """Build the status response for a query"""
+        job = self.job
+        response = {
+            "status": job['status'],
+            "completion": job['completion'],
+            "version": job.get('version', 0),
+            "progress": self.progress,
+            "daily_totals": self.daily_totals,
+            "total_sends": self.total_sends
+        }
+        if job.get('stop_reason'):
+            response['stop_reason'] = job['stop_reason']
+        if query.fields == 'totals':
+            return response
+
+        workspaces = [
+            api_key for api_key in self.workspaces
+            if query.workspaces is None or api_key in query.workspaces
+        ]
+        if query.workspaces is None and query.campaign_ids is None and query.limit is None and query.cursor is None:
+            page = self.campaigns
+            campaigns = self.campaigns
+        else:
+            campaigns = self.campaigns
+            if query.workspaces is not None:
+                campaigns = [c for c in campaigns if c[0] in query.workspaces]
+            if query.campaign_ids is not None:
+                wanted = set(query.campaign_ids)
+                campaigns = [c for c in campaigns if c[1] in wanted]
+            offset = decode_cursor(query.cursor) if query.cursor is not None else 0
+            page = campaigns[offset:offset + query.limit] if query.limit is not None else campaigns[offset:]
+            next_offset = offset + len(page)
+            response['next_cursor'] = encode_cursor(next_offset) if next_offset < len(campaigns) else None
+
+        data = {}
+        for api_key in workspaces:
+            workspace_data, total_sent = self.workspaces[api_key]
+            data[api_key] = workspace_result(workspace_data, {}, total_sent)
+        for api_key, campaign_id in page:
+            data[api_key]["campaign_analytics"][campaign_id] = self.matrices[api_key].campaign_record(campaign_id)
+
+        response['data'] = data
+        return response
+
+
+class StatusCache:
+    """
+    Caches for completed jobs: a few JobViews (LRU by count) and serialized status
+    responses (LRU by bytes, with a TTL) so repeat polls skip sorting and serialization.
+    """
+
+    def __init__(self, view_size: int = VIEW_CACHE_SIZE, response_bytes: int = RESPONSE_CACHE_BYTES,
+                 response_ttl: float = RESPONSE_CACHE_TTL):
+        self.view_size = view_size
+        self.response_bytes = response_bytes
+        self.response_ttl = response_ttl
+        self._views: "OrderedDict[str, JobView]" = OrderedDict()
+        self._responses: "OrderedDict[Tuple, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_response(self, run_id: str, query: StatusQuery) -> Optional[bytes]:
+        key = (run_id,) + query.cache_key()
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time() - self.response_ttl:
+                self._drop_response(key)
+                return None
+            self._responses.move_to_end(key)
+            return entry[0]
+
+    def put_response(self, run_id: str, query: StatusQuery, body: bytes):
+        key = (run_id,) + query.cache_key()
+        with self._lock:
+            self._drop_response(key)
+            if len(body) > self.response_bytes:
+                return
+            self._responses[key] = (body, time.time())
+            self._bytes += len(body)
+            while self._bytes > self.response_bytes:
+                _, (old_body, _) = self._responses.popitem(last=False)
+                self._bytes -= len(old_body)
+
+    def _drop_response(self, key: Tuple):
+        entry = self._responses.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def get_view(self, run_id: str) -> Optional[JobView]:
+        with self._lock:
+            view = self._views.get(run_id)
+            if view is not None:
+                self._views.move_to_end(run_id)
+            return view
+
+    def put_view(self, run_id: str, job: Dict[str, Any]) -> JobView:
+        """Build and keep the view of a completed job"""
+        view = JobView(job)
+        with self._lock:
+            self._views[run_id] = view
+            while len(self._views) > self.view_size:
+                self._views.popitem(last=False)
+        return view
+
+    def invalidate(self, run_id: str):
+        """Forget everything cached for a job"""
+        with self._lock:
+            self._views.pop(run_id, None)
+            for key in [key for key in self._responses if key[0] == run_id]:
+                self._drop_response(key)
+
+
+def serialize(response: Dict[str, Any]) -> bytes:
+    return json.dumps(response, separators=(',', ':')).encode('utf-8')
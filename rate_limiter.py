@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+
+from analytics_cache import workspace_key
+
+logger = logging.getLogger(__name__)
+
+# Configuration for the adaptive rate limiter
+RATE_LIMIT_STATE_PATH = os.environ.get('RATE_LIMIT_STATE_PATH', os.path.join('cache', 'rate_limits.json'))
+INITIAL_RATE = 10.0             # Requests per second for a key we have never seen
+MIN_RATE = 0.5                  # Lower bound for the learned rate (requests per second)
+MAX_RATE = 100.0                # Upper bound for the learned rate (requests per second)
+BURST = 10                      # Maximum number of tokens that can accumulate
+ADDITIVE_INCREASE = 0.5         # Rate grows by about this much per second of healthy traffic
+MULTIPLICATIVE_DECREASE = 0.5   # Rate is multiplied by this on a 429
+SLOW_DECREASE = 0.9             # Rate is multiplied by this when latency is far above target
+DECREASE_COOLDOWN = 1.0         # Minimum seconds between two decreases
+LATENCY_TARGET = 2.0            # Seconds; the rate only grows while latency stays below this
+SAVE_INTERVAL = 30              # Minimum seconds between two writes of the learned rates
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket for one API key whose rate adapts to the upstream (AIMD).
+
+    The rate grows additively while requests succeed with acceptable latency and is cut
+    multiplicatively on 429s or very slow responses. Retry-After and X-RateLimit-* headers
+    pause the bucket until the upstream allows requests again. The limiter is thread-safe
+    and can be shared by coroutines running on different event loops.
+    """
+
+    def __init__(self, rate: float = INITIAL_RATE, on_change=None):
+        self.rate = min(max(rate, MIN_RATE), MAX_RATE)
+        self.latency = None  # Exponentially weighted moving average of response time
+        self._tokens = float(BURST)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._on_change = on_change
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(BURST, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Reserve a token now and sleep until it becomes available
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # A cancelled request gives its reserved token back to the requests still waiting
+                with self._lock:
+                    self._tokens += 1
+                raise
+
+    def blocked_for(self) -> float:
+        """Seconds until the upstream allows requests again"""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def record_response(self, status: int, headers: Mapping[str, str], latency: float):
+        """Adapt the rate to a response from the upstream"""
+        with self._lock:
+            now = time.monotonic()
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            old_rate = self.rate
+
+            retry_after = headers.get('Retry-After')
+            if retry_after is not None:
+                delay = _parse_retry_after(retry_after)
+                if delay is not None:
+                    self._blocked_until = max(self._blocked_until, now + delay)
+
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            if remaining is not None and reset is not None:
+                try:
+                    if float(remaining) <= 0:
+                        reset = float(reset)
+                        # Reset is either an epoch timestamp or a number of seconds
+                        delay = reset - time.time() if reset > 1e9 else reset
+                        self._blocked_until = max(self._blocked_until, now + max(0.0, delay))
+                except ValueError:
+                    pass
+
+            if status == 429:
+                self._decrease(now, MULTIPLICATIVE_DECREASE)
+            elif latency > 2 * LATENCY_TARGET:
+                self._decrease(now, SLOW_DECREASE)
+            elif status < 400 and self.latency <= LATENCY_TARGET:
+                self.rate = min(MAX_RATE, self.rate + ADDITIVE_INCREASE / self.rate)
+
+            changed = self.rate != old_rate
+
+        if changed and self._on_change:
+            self._on_change()
+
+    def _decrease(self, now: float, factor: float):
+        # Requests sent before the last decrease report the same congestion; only react once
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(MIN_RATE, self.rate * factor)
+        self._tokens = min(self._tokens, 0.0)
+        logger.info(f"Reduced request rate to {self.rate:.2f}/s")
+
+
+class RateLimiterRegistry:
+    """Process-wide limiters keyed by API key, with learned rates persisted to disk"""
+
+    def __init__(self, path: str = RATE_LIMIT_STATE_PATH):
+        self.path = path
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._saved_rates = self._load()
+
+    def _load(self) -> Dict[str, float]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {key: float(state['rate']) for key, state in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable rate limit state {self.path}: {str(e)}")
+            return {}
+
+    def get(self, api_key: str) -> AdaptiveRateLimiter:
+        """Get the limiter for an API key, creating it from the saved rate if needed"""
+        key = workspace_key(api_key)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(self._saved_rates.get(key, INITIAL_RATE), on_change=self._changed)
+                self._limiters[key] = limiter
+            return limiter
+
+    def _changed(self):
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Write the learned rates of all keys to disk"""
+        with self._lock:
+            self._last_save = time.monotonic()
+            for key, limiter in self._limiters.items():
+                self._saved_rates[key] = limiter.rate
+            state = {key: {"rate": rate, "updated_at": time.time()} for key, rate in self._saved_rates.items()}
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save rate limit state to {self.path}: {str(e)}")
+
+
+# Shared by every job in the process
+rate_limiters = RateLimiterRegistry()
+
+
+def get_rate_limiter(api_key: str) -> AdaptiveRateLimiter:
+    """Get the process-wide rate limiter for an API key"""
+    return rate_limiters.get(api_key)
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Configuration for send matrices
+INITIAL_ROWS = 64  # Campaign rows allocated up front; the matrix doubles when it fills up
+ABSENT = -1        # Marks a campaign day the upstream returned no data for
+
+
+@lru_cache(maxsize=128)
+def date_range(start_date: str, end_date: str) -> Tuple[Tuple[str, ...], Dict[str, int]]:
+    """Interned date strings of an inclusive range and their column indexes"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    dates = tuple(
+        (start + timedelta(days=offset)).strftime('%Y-%m-%d')
+        for offset in range(max((end - start).days + 1, 0))
+    )
+    return dates, {date: index for index, date in enumerate(dates)}
+
+
+class SendMatrix:
+    """
+    Daily sends of a workspace's campaigns as an int matrix (campaigns x days of the job range).
+
+    Days the upstream returned no data for hold ABSENT, so the JSON shape lists exactly the
+    dates the upstream reported. Totals are vectorized reductions; the nested dict shape of
+    the API is only built by campaign_analytics() / campaign_record() when a client needs it.
+    """
+
+    def __init__(self, start_date: str, end_date: str):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.dates, self._columns = date_range(start_date, end_date)
+        self.campaign_ids: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self.metadata: Dict[str, Dict[str, Any]] = {}  # Campaign name, status and timestamps from the listing
+        self._rows: Dict[str, int] = {}
+        self._values = np.full((INITIAL_ROWS, len(self.dates)), ABSENT, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.campaign_ids)
+
+    def __contains__(self, campaign_id: str) -> bool:
+        return campaign_id in self._rows
+
+    @property
+    def values(self) -> np.ndarray:
+        """The filled rows, one per campaign in campaign_ids order"""
+        return self._values[:len(self.campaign_ids)]
+
+    def add_campaign(self, campaign_id: str) -> int:
+        """Add a campaign row if it is new and return its row index"""
+        row = self._rows.get(campaign_id)
+        if row is not None:
+            return row
+        row = len(self.campaign_ids)
+        if row == self._values.shape[0]:
+            grown = np.full((2 * row, len(self.dates)), ABSENT, dtype=np.int32)
+            grown[:row] = self._values
+            self._values = grown
+        self._rows[campaign_id] = row
+        self.campaign_ids.append(campaign_id)
+        return row
+
+    def add_days(self, campaign_id: str, days: Iterable[Dict[str, Any]]):
+        """Add upstream daily analytics ({'date': ..., 'sent': ...}) to a campaign's row"""
+        index = self.add_campaign(campaign_id)  # May grow and replace the matrix
+        row = self._values[index]
+        columns = []
+        sends = []
+        for day in days:
+            column = self._columns.get(day['date'])
+            if column is not None:
+                columns.append(column)
+                sends.append(day['sent'])
+        if not columns:
+            return
+        columns = np.array(columns, dtype=np.intp)
+        row[columns] = np.maximum(row[columns], 0)
+        np.add.at(row, columns, np.array(sends, dtype=np.int32))
+
+    def set_metadata(self, campaign_id: str, metadata: Dict[str, Any]):
+        self.add_campaign(campaign_id)
+        self.metadata[campaign_id] = {key: value for key, value in metadata.items() if key != "id"}
+
+    def set_error(self, campaign_id: str, error: str):
+        self.add_campaign(campaign_id)
+        self.errors[campaign_id] = error
+
+    def _sends(self) -> np.ndarray:
+        return np.maximum(self.values, 0)
+
+    def campaign_totals(self) -> np.ndarray:
+        return self._sends().sum(axis=1, dtype=np.int64)
+
+    def daily_totals(self) -> Dict[str, int]:
+        """Total sends per date, for dates any campaign has data for"""
+        values = self.values
+        totals = self._sends().sum(axis=0, dtype=np.int64)
+        present = (values != ABSENT).any(axis=0)
+        return {self.dates[column]: int(totals[column]) for column in np.flatnonzero(present)}
+
+    def total(self) -> int:
+        return int(self._sends().sum(dtype=np.int64))
+
+    def campaign_record(self, campaign_id: str) -> Dict[str, Any]:
+        """Daily sends, total, error and listing metadata of one campaign in the API's JSON shape"""
+        row = self.values[self._rows[campaign_id]]
+        columns = np.flatnonzero(row != ABSENT)
+        daily_sends = dict(zip([self.dates[column] for column in columns], row[columns].tolist()))
+        return {
+            "daily_sends": daily_sends,
+            "total_sent": int(row[columns].sum(dtype=np.int64)),
+            "error": self.errors.get(campaign_id),
+            **self.metadata.get(campaign_id, {})
+        }
+
+    def campaign_analytics(self, campaign_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """campaign_analytics in the API's JSON shape, for all or the given campaigns"""
+        if campaign_ids is None:
+            campaign_ids = self.campaign_ids
+        return {campaign_id: self.campaign_record(campaign_id) for campaign_id in campaign_ids}
+
+    def iter_records(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for campaign_id in self.campaign_ids:
+            yield campaign_id, self.campaign_record(campaign_id)
+
+    def to_json(self) -> Dict[str, Any]:
+        """Compact JSON-serializable form, restored by from_json()"""
+        return {
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "campaign_ids": self.campaign_ids,
+            "errors": self.errors,
+            "metadata": self.metadata,
+            "sends": self.values.tolist()
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "SendMatrix":
+        matrix = cls(data["start_date"], data["end_date"])
+        matrix.campaign_ids = list(data["campaign_ids"])
+        matrix.errors = dict(data["errors"])
+        matrix.metadata = dict(data.get("metadata", {}))
+        matrix._rows = {campaign_id: row for row, campaign_id in enumerate(matrix.campaign_ids)}
+        if matrix.campaign_ids:
+            matrix._values = np.array(data["sends"], dtype=np.int32).reshape(len(matrix.campaign_ids), len(matrix.dates))
+        return matrix
+
+
+def workspace_matrix(workspace_data: Dict[str, Any]) -> SendMatrix:
+    """The SendMatrix of a workspace result, which is stored as JSON once the job has finished"""
+    campaigns = workspace_data["campaigns"]
+    if isinstance(campaigns, SendMatrix):
+        return campaigns
+    return SendMatrix.from_json(campaigns)
@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Configuration for progress reporting
+PROGRESS_LOG_INTERVAL = 10  # Minimum seconds between progress reports
+
+# Configuration for deferred retries
+RETRY_SHARE = 0.25  # Share of the in-flight slots retries may take while new tasks are waiting
+
+# Decides whether a failed task is retried later: (delay, factory of the retry awaitable), or None
+RetryPolicy = Callable[[Any, BaseException], Optional[Tuple[float, Callable[[], Awaitable]]]]
+
+
+async def run_sliding_window(tasks: Union[Iterable[Tuple[Any, Awaitable]], AsyncIterable[Tuple[Any, Awaitable]]],
+                             max_in_flight: int, total: Optional[int] = None,
+                             label: str = "tasks", retry: Optional[RetryPolicy] = None) -> AsyncIterator[Tuple[Any, Any]]:
+    """
+    Run awaitables with at most max_in_flight running at any time.
+    Args:
+        tasks: Iterable or async iterable of (key, awaitable) pairs. It is consumed lazily, one item
+            per free slot, so a generator can create its coroutines on demand. An async iterable
+            is advanced while the running awaitables are in flight.
+        max_in_flight: Number of awaitables kept running at all times.
+        total: Expected number of tasks, used only for progress reports.
+        label: Name used for the tasks in progress reports.
+        retry: Called with (key, exception) when an awaitable fails. If it returns (delay, factory),
+            the task is retried with factory() once delay seconds have passed instead of being
+            yielded. Retries wait outside the window, so they don't hold a slot while backing off,
+            and take at most RETRY_SHARE of the slots while new tasks are waiting.
+    Yields:
+        (key, result) pairs as soon as each awaitable finishes, where result is the exception
+        raised by the awaitable if it failed.
+    """
+    is_async = hasattr(tasks, '__aiter__')
+    source = tasks.__aiter__() if is_async else iter(tasks)
+    in_flight = {}
+    next_item = None  # Pending __anext__() of an async source
+    exhausted = False
+    started = completed = failed = retried = 0
+    start_time = last_report = time.monotonic()
+    delayed = []         # Heap of (ready time, tiebreaker, key, factory) of tasks waiting to be retried
+    retrying = set()     # In-flight tasks that are retries
+    retry_slots = max(1, int(max_in_flight * RETRY_SHARE))
+    order = itertools.count()
+
+    def fill():
+        nonlocal exhausted, started, next_item
+        now = time.monotonic()
+        while len(in_flight) < max_in_flight:
+            # Retries that are due go first, within their share of the slots unless nothing else is left
+            if delayed and delayed[0][0] <= now and (exhausted or len(retrying) < retry_slots):
+                _, _, key, factory = heapq.heappop(delayed)
+                task = asyncio.ensure_future(factory())
+                in_flight[task] = key
+                retrying.add(task)
+                continue
+            if exhausted:
+                break
+            if is_async:
+                # Only one item is requested at a time; it is added once it arrives
+                if next_item is None:
+                    next_item = asyncio.ensure_future(source.__anext__())
+                return
+            try:
+                key, awaitable = next(source)
+            except StopIteration:
+                exhausted = True
+                continue
+            in_flight[asyncio.ensure_future(awaitable)] = key
+            started += 1
+
+    try:
+        fill()
+        while in_flight or next_item is not None or delayed:
+            waiting = set(in_flight)
+            if next_item is not None:
+                waiting.add(next_item)
+            # Wake up when the next retry is due, if it could take a free slot; a retry that
+            # finishes wakes us up anyway when retries already use their share
+            timeout = None
+            if delayed and len(in_flight) < max_in_flight and (exhausted or len(retrying) < retry_slots):
+                timeout = max(0.0, delayed[0][0] - time.monotonic())
+            if waiting:
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(timeout)
+                done = set()
+
+            if next_item is not None and next_item in done:
+                item, next_item = next_item, None
+                try:
+                    key, awaitable = item.result()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    in_flight[asyncio.ensure_future(awaitable)] = key
+                    started += 1
+
+            finished = []
+            for task in done:
+                if task not in in_flight:
+                    continue
+                key = in_flight.pop(task)
+                retrying.discard(task)
+                if task.exception() is not None:
+                    deferred = retry(key, task.exception()) if retry is not None else None
+                    if deferred is not None:
+                        delay, factory = deferred
+                        heapq.heappush(delayed, (time.monotonic() + delay, next(order), key, factory))
+                        retried += 1
+                        continue
+                    failed += 1
+                    finished.append((key, task.exception()))
+                else:
+                    completed += 1
+                    finished.append((key, task.result()))
+
+            # Refill the freed slots before handing results to the caller
+            fill()
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_LOG_INTERVAL:
+                last_report = now
+                expected = f"/{total}" if total is not None else ""
+                rate = (completed + failed) / (now - start_time)
+                logger.info(f"Progress: {completed + failed}{expected} {label} done "
+                            f"({completed} successful, {failed} failed, {len(in_flight)} in flight, "
+                            f"{len(delayed)} waiting to retry, {rate:.1f}/s)")
+
+            for item in finished:
+                yield item
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if next_item is not None:
+            next_item.cancel()
+            await asyncio.gather(next_item, return_exceptions=True)
+        # Close coroutines that were never scheduled so they don't warn about not being awaited
+        if not exhausted:
+            if is_async:
+                if hasattr(source, 'aclose'):
+                    await source.aclose()
+            else:
+                for _, awaitable in source:
+                    if asyncio.iscoroutine(awaitable):
+                        awaitable.close()
+
+    logger.info(f"Completed {completed + failed} {label} in {time.monotonic() - start_time:.1f}s "
+                f"({completed} successful, {failed} failed, {retried} retries deferred)")
+
+
+async def prefetch(source: AsyncIterable, depth: int = 1) -> AsyncIterator:
+    """
+    Iterate an async iterable in a background task, keeping items ready ahead of the consumer.
+    Args:
+        source: Async iterable to read from (e.g. pages of an API listing).
+        depth: Number of items buffered ahead; the producer is already loading the next one.
+    Yields:
+        Items of source in order. An exception raised by source is re-raised here.
+    """
+    queue = asyncio.Queue(maxsize=depth)
+    end = object()
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+            await queue.put((end, None))
+        except Exception as e:
+            await queue.put((end, e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        producer.cancel()
@@ -0,0 +1,29 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import api_server
+from rate_limiter import rate_limiters
+from test_overlapping_jobs import CAMPAIGNS, dates_between, fake_upstream, sends_on  # noqa: F401
+
+
+def test_stream_sends_campaign_records(fake_upstream, tmp_path, monkeypatch):
+    """Campaign records streamed by the FastAPI server carry the campaign's daily sends"""
+    monkeypatch.setattr(rate_limiters, 'path', str(tmp_path / 'rate_limits.json'))
+    request = {
+        'api_keys': ['test-key'],
+        'start_date': '2024-01-01',
+        'end_date': '2024-01-07',
+        'granularity': 'campaign'
+    }
+    with TestClient(api_server.app) as client:
+        response = client.post('/analytics/bulk/stream', json=request)
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines() if line]
+
+    campaign_records = {record['campaign_id']: record for record in records if record['type'] == 'campaign'}
+    assert set(campaign_records) == set(CAMPAIGNS)
+    for campaign_id, record in campaign_records.items():
+        assert record['daily_sends'] == {date: sends_on(campaign_id, date)
+                                         for date in dates_between('2024-01-01', '2024-01-07')}
+        assert record['total_sent'] == sum(record['daily_sends'].values())
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+from async_http import DeferredRetry, fetch_with_retry
+from circuit_breaker import (CircuitBreaker, CircuitOpenError, MIN_FAILURES, OPEN_SECONDS, PROBE_WAIT,
+                             get_host_breaker)
+
+URL = 'https://upstream.test/api/v2/campaigns/analytics/daily'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock the breakers read instead of time.monotonic(), leaving the event loop's clock alone"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=lambda: now.value))
+    monkeypatch.setattr(circuit_breaker, 'circuit_breakers', {})
+    return now
+
+
+def open_breaker(breaker):
+    for index in range(MIN_FAILURES):
+        breaker.record(True, f'campaign-{index}')
+
+
+def test_opens_when_most_requests_fail(clock):
+    breaker = CircuitBreaker('test')
+    for index in range(MIN_FAILURES - 1):
+        breaker.record(True, f'campaign-{index}')
+    breaker.check()
+    breaker.record(True, f'campaign-{MIN_FAILURES}')
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert not error.value.tripped
+    assert error.value.retry_in == OPEN_SECONDS
+
+
+def test_counts_each_failing_resource_once(clock):
+    breaker = CircuitBreaker('test')
+    for _ in range(3 * MIN_FAILURES):
+        breaker.record(True, 'broken-campaign')
+    breaker.check()
+    assert not breaker.is_open
+
+
+def test_stays_closed_while_most_requests_succeed(clock):
+    breaker = CircuitBreaker('test')
+    for index in range(MIN_FAILURES + 1):
+        breaker.record(False, f'campaign-{index}')
+    open_breaker(breaker)
+    breaker.check()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker('test')
+    open_breaker(breaker)
+    clock.value += OPEN_SECONDS
+    breaker.check()
+    assert breaker.claim()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.claim()
+    assert error.value.retry_in == PROBE_WAIT
+
+    breaker.record(False)
+    assert not breaker.is_open
+    assert not breaker.claim()
+
+
+def test_failed_probe_reopens_for_twice_as_long(clock):
+    breaker = CircuitBreaker('test')
+    open_breaker(breaker)
+    clock.value += OPEN_SECONDS
+    assert breaker.claim()
+    breaker.record(True)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_in == 2 * OPEN_SECONDS
+
+
+def test_released_probe_can_be_claimed_again(clock):
+    breaker = CircuitBreaker('test')
+    open_breaker(breaker)
+    clock.value += OPEN_SECONDS
+    assert breaker.claim()
+    breaker.release()
+    assert breaker.claim()
+
+
+def test_trip_rejects_the_key_until_a_probe_succeeds(clock):
+    breaker = CircuitBreaker('test')
+    breaker.trip(60)
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.tripped
+    clock.value += 60
+    assert breaker.claim()
+    breaker.record(False)
+    breaker.check()
+
+
+def test_open_host_leaves_the_key_probe_free(clock):
+    """A request held back by the host's breaker must not claim the key's probe"""
+    key_breaker = CircuitBreaker('key')
+    open_breaker(key_breaker)
+    clock.value += OPEN_SECONDS
+    open_breaker(get_host_breaker(URL))
+
+    with pytest.raises(DeferredRetry):
+        asyncio.run(fetch_with_retry(None, URL, {}, {}, breaker=key_breaker, defer_retries=True))
+    assert key_breaker.claim()
+
+
+def test_cancelled_probe_is_released(clock):
+    key_breaker = CircuitBreaker('key')
+    open_breaker(key_breaker)
+    clock.value += OPEN_SECONDS
+
+    class HangingSession:
+        def get(self, url, headers=None, params=None):
+            return self
+
+        async def __aenter__(self):
+            await asyncio.Event().wait()
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(fetch_with_retry(HangingSession(), URL, {}, {}, breaker=key_breaker))
+        await asyncio.sleep(0)
+        assert key_breaker.is_open
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert key_breaker.claim()
@@ -14,16 +14,22 @@ def test_api():
     
     print(f"\nFetching data from {start_date_str} to {end_date_str} (30 days)")
 
-    def check_job_status(run_id, delay=5):
-        """Check job status until completion"""
+    def check_job_status(run_id, wait=30):
+        """Check job status until completion, letting the server hold each request until the job changes"""
         last_completion = -1
         last_update_time = time.time()
+        version = 0
         
         while True:
             try:
-                response = requests.get(f'http://localhost:5000/analytics/bulk/status/{run_id}')
+                response = requests.get(
+                    f'http://localhost:5000/analytics/bulk/status/{run_id}',
+                    params={'since': version, 'wait': wait},
+                    timeout=wait + 10
+                )
                 response.raise_for_status()
                 data = response.json()
+                version = data.get('version', version)
                 
                 completion = data['completion']
                 if completion != last_completion:
@@ -43,8 +49,6 @@ def test_api():
                 elif data['status'] == 'failed':
                     print(f"\nJob failed: {data.get('error', 'Unknown error')}")
                     return None
-                    
-                time.sleep(delay)
             except requests.exceptions.RequestException as e:
                 print(f"\nError checking status: {e}")
                 print("Retrying in 10 seconds...")
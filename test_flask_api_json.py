@@ -14,14 +14,20 @@ def test_api():
     
     print(f"\nFetching data from {start_date_str} to {end_date_str} (30 days)")
 
-    def check_job_status(run_id, max_retries=60, delay=5):
-        """Check job status with retries"""
-        retries = 0
-        while retries < max_retries:
+    def check_job_status(run_id, max_wait=1800, wait=30):
+        """Check job status until it finishes or max_wait seconds pass, letting the server hold each request until the job changes"""
+        deadline = time.time() + max_wait
+        version = 0
+        while time.time() < deadline:
             try:
-                response = requests.get(f'http://localhost:5000/analytics/bulk/status/{run_id}')
+                response = requests.get(
+                    f'http://localhost:5000/analytics/bulk/status/{run_id}',
+                    params={'since': version, 'wait': wait},
+                    timeout=wait + 10
+                )
                 response.raise_for_status()
                 data = response.json()
+                version = data.get('version', version)
                 
                 print(f"\rJob completion: {data['completion']}%", end="")
                 
@@ -31,9 +37,9 @@ def test_api():
                 elif data['status'] == 'failed':
                     print(f"\nJob failed: {data.get('error', 'Unknown error')}")
                     return None
-                    
-                retries += 1
-                time.sleep(delay)
+                elif data['status'] == 'cancelled':
+                    print("\nJob was cancelled")
+                    return None
             except Exception as e:
                 print(f"\nError checking status: {e}")
                 return None
@@ -47,7 +53,8 @@ def test_api():
             "NDZhOGRkM2ItNTg1NS00YzJkLTkxOWYtNTlkNDJmYjFkY2M5OmdxVUNab1dKdWpnUQ=="
         ],
         "start_date": start_date_str,
-        "end_date": end_date_str
+        "end_date": end_date_str,
+        "granularity": "campaign"  # Per-campaign breakdown is saved below
     }
 
     try:
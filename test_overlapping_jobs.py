@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics_pipeline
+from analytics_cache import AnalyticsCache
+from instantly_campaign_api import AsyncInstantlyCampaignAPI
+from instantly_campaign_analytics_api import AsyncInstantlyCampaignAnalyticsAPI
+
+CAMPAIGNS = ['campaign-1', 'campaign-2']
+
+
+def sends_on(campaign_id, date):
+    """Deterministic daily sends of a fake campaign"""
+    return (sum(map(ord, campaign_id)) + int(date.replace('-', ''))) % 20 + 1
+
+
+def dates_between(start_date, end_date):
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    return [(start + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range((end - start).days + 1)]
+
+
+@pytest.fixture
+def fake_upstream(tmp_path, monkeypatch):
+    """Replace the Instantly clients with fakes and the analytics cache with an empty one"""
+    requested = []
+
+    async def iter_campaign_pages(self, limit=100, search=None, tag_ids=None):
+        yield [{"id": campaign_id, "name": campaign_id, "status": 1} for campaign_id in CAMPAIGNS]
+
+    async def get_daily_campaign_analytics(self, campaign_id, start_date, end_date=None, campaign_status=None,
+                                           attempt=0, defer_retries=False):
+        requested.append((campaign_id, start_date, end_date))
+        campaigns = [campaign_id] if campaign_id is not None else CAMPAIGNS
+        return [
+            {"date": date, "sent": sum(sends_on(campaign, date) for campaign in campaigns)}
+            for date in dates_between(start_date, end_date or start_date)
+        ]
+
+    monkeypatch.setattr(AsyncInstantlyCampaignAPI, 'iter_campaign_pages', iter_campaign_pages)
+    monkeypatch.setattr(AsyncInstantlyCampaignAnalyticsAPI, 'get_daily_campaign_analytics', get_daily_campaign_analytics)
+    monkeypatch.setattr(analytics_pipeline, 'analytics_cache', AnalyticsCache(str(tmp_path / 'analytics_cache.db')))
+    return requested
+
+
+def run_job(start_date, end_date, granularity):
+    results = {'data': {}, 'daily_totals': {}, 'total_sends': 0}
+    asyncio.run(analytics_pipeline.process_workspaces(
+        None, ['test-key'], start_date, end_date, results, granularity=granularity
+    ))
+    return results
+
+
+@pytest.mark.parametrize('granularity', analytics_pipeline.GRANULARITIES)
+def test_overlapping_jobs_on_warm_cache(fake_upstream, granularity):
+    """A job overlapping a cached one fetches only the missing days and counts each day once"""
+    run_job('2024-01-10', '2024-01-20', granularity)
+    fake_upstream.clear()
+    results = run_job('2024-01-01', '2024-01-31', granularity)
+
+    expected = {date: sum(sends_on(campaign, date) for campaign in CAMPAIGNS)
+                for date in dates_between('2024-01-01', '2024-01-31')}
+    assert results['daily_totals'] == expected
+    assert results['total_sends'] == sum(expected.values())
+    for _, start_date, end_date in fake_upstream:
+        assert end_date < '2024-01-10' or start_date > '2024-01-20'